@@ -1,7 +1,7 @@
 """Configuration management for the application."""
 
-from pydantic_settings import BaseSettings
-from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from pydantic import AliasChoices, Field
 from typing import Optional
 
 
@@ -24,30 +24,32 @@ class Settings(BaseSettings):
     default_page_size: int = 50
     max_page_size: int = 500
 
+    # Indexing
+    max_concurrent_indexing: int = 1  # Indexing jobs allowed to run at the same time
+    site_indexing_concurrency: int = 4  # Sites indexed in parallel within a job
+    folder_listing_concurrency: int = 8  # Folder listing batch calls (20 folders each) in flight per site
+    sharepoint_requests_per_second: int = 20  # Cap on SharePoint service Graph requests (sliding 1s window)
+    graph_concurrency: int = 4  # Graph batch calls in flight per mailbox (Outlook allows ~4 per mailbox)
+    email_requests_per_second: float = 12.0  # Ceiling for the email service's adaptive request rate
+
     # Logging
     log_level: str = "INFO"
 
     # Server Settings
     host: str = "0.0.0.0"
-    port: int = Field(default=8000, description="Server port (use PORT env var for Cloud Run)")
-    
-    # Auto-detect port from environment (for Cloud Run)
-    def __init__(self, **kwargs):
-        import os
-        if "PORT" in os.environ and "port" not in kwargs:
-            kwargs["port"] = int(os.environ["PORT"])
-        super().__init__(**kwargs)
+    port: int = Field(
+        default=8000,
+        validation_alias=AliasChoices("PORT", "port"),
+        description="Server port (use PORT env var for Cloud Run)",
+    )
 
     # SSO Authentication Settings
     sso_redirect_uri: Optional[str] = None  # Will be set based on deployment
     sso_allowed_domain: str = "sindbad.tech"  # Only allow @sindbad.tech emails
     session_secret_key: str = "change-this-to-a-random-secret-key-in-production"  # Change in production!
+    session_redis_url: Optional[str] = None  # e.g. redis://localhost:6379/0 (empty = signed cookie sessions)
 
-    class Config:
-        """Pydantic config."""
-
-        env_file = ".env"
-        case_sensitive = False
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
 
 
 # Global settings instance
@@ -1,163 +1,415 @@
 """Main FastAPI application."""
 
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Tuple
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse, Response
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.types import ASGIApp
-from app.routes import sharepoint, auth
-from app.utils.logger import setup_logger
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.routes import auth
+from app.utils.logger import configure_app_logging, setup_logger, stop_logging
+from app.utils.responses import ORJSONResponse
 from app.config import settings
+import hashlib
+import mimetypes
 import os
+import orjson
 
 logger = setup_logger(__name__)
 
+# Session cookie name, shared by the session middleware and FastAuthMiddleware
+SESSION_COOKIE = "session"
+
+
+def _include_sharepoint_router(app: FastAPI) -> None:
+    """Register the SharePoint API routes (once, even if lifespan reruns).
+
+    Imported here rather than at module level so importing app.main does
+    not pull in the Graph, indexing and email services.
+    """
+    if getattr(app.state, "sharepoint_router_included", False):
+        return
+    from app.routes import sharepoint
+
+    app.include_router(sharepoint.router)
+    app.state.sharepoint_router_included = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown."""
+    configure_app_logging()
+    logger.info("Sindbad.Tech SharePoint Doc Indexer starting up...")
+    try:
+        # Create the MSAL client up front so the first login doesn't pay for it
+        auth.init_auth_service()
+    except Exception as e:
+        logger.warning(f"Auth service not initialized at startup, will retry on first login: {e}")
+    _include_sharepoint_router(app)
+    yield
+    logger.info("Sindbad.Tech SharePoint Doc Indexer shutting down...")
+    await auth.close_auth_service()
+    from app.routes import sharepoint
+
+    await sharepoint.close_services()
+    stop_logging()
+
+class FastAuthMiddleware:
+    """Validate the signed auth cookie on hot GET routes.
+
+    With a valid cookie the request is marked with ``state["auth_fast"]`` and
+    the session cookie is dropped, so SessionMiddleware has nothing to verify
+    or decode. Otherwise the request falls through to the normal session check.
+    """
+
+    paths = frozenset({"/", "/api/user"})
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["method"] == "GET" and scope["path"] in self.paths:
+            scope = self._check_auth_cookie(scope)
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _check_auth_cookie(scope: Scope) -> Scope:
+        headers = scope["headers"]
+        cookie_header = next((value for name, value in headers if name == b"cookie"), None)
+        if cookie_header is None:
+            return scope
+
+        cookies = cookie_parser(cookie_header.decode("latin-1"))
+        token = cookies.get(auth.AUTH_COOKIE)
+        user = auth.read_auth_cookie(token) if token else None
+        if user is None:
+            return scope
+
+        state = scope.setdefault("state", {})
+        state["auth_fast"] = True
+        state["auth_user"] = user
+        # Drop only the session cookie's raw segment so the other cookies reach
+        # downstream code exactly as the browser sent them
+        session_prefix = SESSION_COOKIE.encode("latin-1") + b"="
+        remaining = b";".join(
+            segment for segment in cookie_header.split(b";")
+            if not segment.lstrip().startswith(session_prefix)
+        )
+        headers = [(name, value) for name, value in headers if name != b"cookie"]
+        if remaining.strip():
+            headers.append((b"cookie", remaining.lstrip()))
+        return {**scope, "headers": headers}
+
+
+class WellKnownNotFound:
+    """Reject /.well-known/* requests (Chrome DevTools, etc.) up front.
+
+    Nothing is served under /.well-known, so these get a pre-serialized 404
+    without going through sessions, CORS or the router.
+    """
+
+    body = orjson.dumps({"status": "not_found"})
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["path"].startswith("/.well-known/"):
+            await send({"type": "http.response.start", "status": 404, "headers": self.headers})
+            await send({"type": "http.response.body", "body": self.body})
+            return
+        await self.app(scope, receive, send)
+
+
+class SimpleCORS:
+    """Allow-all CORS without per-request origin/method/header matching.
+
+    Every origin is allowed with credentials, so the request Origin is
+    echoed back. Requests without an Origin header pass through untouched
+    and preflight requests are answered without invoking the app.
+    """
+
+    allow_methods = b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+    replaced_headers = (b"access-control-allow-origin", b"access-control-allow-credentials")
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        cors_headers = [
+            (b"access-control-allow-origin", origin),
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+        ]
+
+        if scope["method"] == "OPTIONS" and any(
+            name == b"access-control-request-method" for name, _ in scope["headers"]
+        ):
+            cors_headers.append((b"access-control-allow-methods", self.allow_methods))
+            cors_headers.append((b"access-control-max-age", b"600"))
+            if request_headers:
+                cors_headers.append((b"access-control-allow-headers", request_headers))
+            await send({"type": "http.response.start", "status": 204, "headers": cors_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Replace any CORS headers set by a route, keeping duplicates like set-cookie
+                headers = [
+                    (name, value)
+                    for name, value in message.get("headers") or []
+                    if name not in self.replaced_headers
+                ]
+                headers.extend(cors_headers)
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
 # Create FastAPI app
 app = FastAPI(
     title="Sindbad.Tech SharePoint Doc Indexer",
     description="Web application to index and search SharePoint documents",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Session middleware (must be before other middleware)
-app.add_middleware(
-    SessionMiddleware,
-    secret_key=settings.session_secret_key,
-    max_age=86400,  # 24 hours
-    same_site="lax",
-    https_only=False,  # Allow HTTP for local development
-)
+if settings.session_redis_url:
+    # Server-side sessions: only a session ID rides in the cookie
+    from starsessions import SessionAutoloadMiddleware
+    from starsessions import SessionMiddleware as RedisSessionMiddleware
+    from starsessions.stores.redis import RedisStore
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, specify actual origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    app.add_middleware(SessionAutoloadMiddleware)
+    app.add_middleware(
+        RedisSessionMiddleware,
+        store=RedisStore(settings.session_redis_url),
+        lifetime=86400,  # 24 hours
+        cookie_name=SESSION_COOKIE,
+        cookie_same_site="lax",
+        cookie_https_only=False,  # Allow HTTP for local development
+    )
+else:
+    app.add_middleware(
+        SessionMiddleware,
+        secret_key=settings.session_secret_key,
+        session_cookie=SESSION_COOKIE,
+        max_age=86400,  # 24 hours
+        same_site="lax",
+        https_only=False,  # Allow HTTP for local development
+    )
 
-# Add cache control headers for static files
-class NoCacheStaticFiles(StaticFiles):
-    """Static files with no-cache headers."""
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-    
-    async def __call__(self, scope, receive, send):
-        if scope["type"] == "http":
-            async def send_wrapper(message):
-                if message["type"] == "http.response.start":
-                    message.setdefault("headers", [])
-                    headers = dict(message["headers"])
-                    headers[b"cache-control"] = b"no-cache, no-store, must-revalidate"
-                    headers[b"pragma"] = b"no-cache"
-                    headers[b"expires"] = b"0"
-                    message["headers"] = list(headers.items())
-                await send(message)
-            await super().__call__(scope, receive, send_wrapper)
-        else:
-            await super().__call__(scope, receive, send)
+# Compress HTML and JSON bodies (login page, file listings, stats)
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
+# Fast auth check for hot routes (must wrap SessionMiddleware)
+app.add_middleware(FastAuthMiddleware)
+
+# CORS middleware (allows any origin; in production, restrict origins)
+app.add_middleware(SimpleCORS)
+
+# Answer .well-known probes before any other middleware runs (must be last)
+app.add_middleware(WellKnownNotFound)
 
 # Include routers
 app.include_router(auth.router)
-app.include_router(sharepoint.router)
 
-# Mount static files
+# Static files are small and only change on deploy, so read them once
 static_dir = os.path.join(os.path.dirname(__file__), "..", "static")
-if os.path.exists(static_dir):
-    app.mount("/static", NoCacheStaticFiles(directory=static_dir), name="static")
+
+
+def _load_static_assets(directory: str) -> Dict[str, Tuple[bytes, str, str]]:
+    """Read every file under the static directory into memory.
+
+    Args:
+        directory: Static files directory
+
+    Returns:
+        Dict mapping URL path to (body, etag, media type)
+    """
+    assets: Dict[str, Tuple[bytes, str, str]] = {}
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            file_path = os.path.join(root, filename)
+            url_path = os.path.relpath(file_path, directory).replace(os.sep, "/")
+            with open(file_path, "rb") as f:
+                body = f.read()
+            media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            # Weak, since GZipMiddleware serves the same validator for gzip and identity bodies
+            assets[url_path] = (body, f'W/"{hashlib.md5(body).hexdigest()}"', media_type)
+    return assets
+
+
+_STATIC_CACHE = _load_static_assets(static_dir) if os.path.exists(static_dir) else {}
+_INDEX_FILE = os.path.join(static_dir, "index.html")
+_INDEX_EXISTS = os.path.exists(_INDEX_FILE)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison).
+
+    Args:
+        if_none_match: Raw If-None-Match header value
+        etag: ETag of the current representation
+
+    Returns:
+        True if the client's cached copy is still current
+    """
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag.removeprefix("W/"):
+            return True
+    return False
+
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_files(path: str, request: Request) -> Response:
+    """Serve a static asset from the in-memory cache.
+
+    Browsers revalidate on every load (no-cache) so a redeploy is picked up
+    immediately, but unchanged assets are answered with an empty 304.
+    """
+    asset = _STATIC_CACHE.get(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    body, etag, media_type = asset
+    headers = {"etag": etag, "cache-control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+# Error bodies are assembled from pre-serialized fragments, since the
+# handlers fire on every bot probe and bad request
+_HEALTH_BODY = orjson.dumps({
+    "status": "healthy",
+    "service": "Sindbad.Tech SharePoint Doc Indexer",
+    "version": "1.0.0"
+})
+_HTTP_ERROR_PREFIX = b'{"error":'
+_VALIDATION_ERROR_PREFIX = b'{"error":"Validation failed","details":'
+_INTERNAL_ERROR_PREFIX = b'{"error":"Internal server error","detail":'
+
+
+def _json_response(body: bytes, status_code: int) -> Response:
+    """Wrap a pre-serialized JSON body in a response."""
+    return Response(content=body, status_code=status_code, media_type="application/json")
 
 
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     """Handle HTTP exceptions."""
     logger.error(f"HTTP {exc.status_code}: {exc.detail}")
-    return JSONResponse(
-        status_code=exc.status_code,
-        content={"error": exc.detail, "status_code": exc.status_code}
-    )
+    body = b"".join((
+        _HTTP_ERROR_PREFIX,
+        orjson.dumps(exc.detail, default=str),
+        b',"status_code":',
+        str(exc.status_code).encode(),
+        b"}",
+    ))
+    return _json_response(body, exc.status_code)
 
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle validation errors."""
-    logger.error(f"Validation error: {exc.errors()}")
-    return JSONResponse(
-        status_code=422,
-        content={"error": "Validation failed", "details": exc.errors()}
-    )
+    errors = exc.errors()
+    logger.error(f"Validation error: {errors}")
+    body = _VALIDATION_ERROR_PREFIX + orjson.dumps(errors, default=str) + b"}"
+    return _json_response(body, 422)
 
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle general exceptions."""
     logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
-        status_code=500,
-        content={"error": "Internal server error", "detail": str(exc)}
-    )
+    body = _INTERNAL_ERROR_PREFIX + orjson.dumps(str(exc)) + b"}"
+    return _json_response(body, 500)
 
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Serve the main application page (protected by authentication)."""
     # Check if user is authenticated
-    if not request.session.get("authenticated"):
+    auth_fast = getattr(request.state, "auth_fast", False)
+    if not (auth_fast or request.session.get("authenticated")):
         return RedirectResponse(url="/auth/login", status_code=302)
     
-    static_file = os.path.join(static_dir, "index.html")
-    if os.path.exists(static_file):
-        return FileResponse(static_file)
-        return HTMLResponse(
+    if _INDEX_EXISTS:
+        response = FileResponse(_INDEX_FILE)
+    else:
+        response = HTMLResponse(
             content="<h1>Sindbad.Tech SharePoint Doc Indexer</h1><p>Frontend not found. Please check static files.</p>"
         )
+    if not auth_fast:
+        auth.set_auth_cookie(response, request.session.get("user", {}))
+    return response
 
 
 @app.get("/api/user")
-async def get_current_user(request: Request) -> Dict[str, Any]:
+async def get_current_user(request: Request, response: Response) -> Dict[str, Any]:
     """Get current authenticated user info.
     
     Returns:
         User information or 401 if not authenticated
     """
+    if getattr(request.state, "auth_fast", False):
+        return request.state.auth_user
+    
     if not request.session.get("authenticated"):
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    return request.session.get("user", {})
+    user = request.session.get("user", {})
+    auth.set_auth_cookie(response, user)
+    return user
 
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint for Cloud Run and monitoring."""
-    return JSONResponse(
-        status_code=200,
-        content={
-            "status": "healthy",
-            "service": "Sindbad.Tech SharePoint Doc Indexer",
-            "version": "1.0.0"
-        }
-    )
-
-
-@app.get("/.well-known/{path:path}")
-async def well_known_handler(path: str):
-    """Handle .well-known requests (Chrome DevTools, etc.)."""
-    return JSONResponse(status_code=404, content={"status": "not_found"})
+    return _json_response(_HEALTH_BODY, 200)
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Application startup event."""
-    logger.info("Sindbad.Tech SharePoint Doc Indexer starting up...")
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Application shutdown event."""
-    logger.info("Sindbad.Tech SharePoint Doc Indexer shutting down...")
+if __name__ == "__main__":
+    import sys
+    import uvicorn
 
+    # uvloop is not available on Windows; uvicorn[standard] installs it elsewhere
+    uvicorn.run(
+        "app.main:app",
+        host=settings.host,
+        port=settings.port,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+    )
@@ -1,26 +1,100 @@
 """Data models for SharePoint index structure."""
 
+from dataclasses import dataclass
 from datetime import datetime
+from operator import attrgetter
+from sys import intern
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class FileMetadata(BaseModel):
     """Metadata for a SharePoint file or email attachment."""
 
+    model_config = ConfigDict(defer_build=True)
+
     id: str
     name: str
     path: str = ""  # File path for flat list structure, or email subject for attachments
     file_type: str = ""  # File extension/type
-    web_url: Optional[HttpUrl] = None
+    web_url: Optional[str] = None
     size: Optional[int] = None
     created_date_time: Optional[datetime] = None
     last_modified_date_time: Optional[datetime] = None
     created_by: Optional[str] = None
     last_modified_by: Optional[str] = None
     mime_type: Optional[str] = None
-    download_url: Optional[HttpUrl] = None
+    download_url: Optional[str] = None
     source: str = "sharepoint"  # "sharepoint" or "email" to distinguish source
+    name_lower: str = Field(default="", exclude=True, repr=False)  # Sort key, derived from name
+    # Display values for the file list, derived once
+    # (ISO-8601 dates are "" when unknown; type falls back to the upper-cased extension)
+    created_date_iso: str = Field(default="", exclude=True, repr=False)
+    modified_date_iso: str = Field(default="", exclude=True, repr=False)
+    display_type: str = Field(default="", exclude=True, repr=False)
+
+    def model_post_init(self, __context: Any) -> None:
+        """Derive lookup keys and display values from the validated fields."""
+        fields = self.__dict__
+        # Types and people repeat across many files, so share one copy of each value
+        for field in ("file_type", "created_by", "last_modified_by", "mime_type"):
+            value = fields[field]
+            if value:
+                fields[field] = intern(value)
+        name = self.name
+        fields["name_lower"] = name.lower()
+        created, modified = self.created_date_time, self.last_modified_date_time
+        fields["created_date_iso"] = created.isoformat() if created else ""
+        fields["modified_date_iso"] = modified.isoformat() if modified else ""
+        file_type = self.file_type
+        if not file_type and '.' in name:
+            file_type = name.rpartition('.')[2].upper()
+        fields["display_type"] = intern(file_type)
+
+
+@dataclass(frozen=True)
+class FileTable:
+    """Name-sorted, column-oriented view of a site's files for listing pages.
+
+    Each field is a list with one entry per file, in lowercase-name order, so a
+    page of the file list is read by position without touching FileMetadata.
+    """
+
+    names_lower: List[str]
+    names: List[str]
+    urls: List[str]
+    types: List[str]
+    created: List[str]
+    modified: List[str]
+    owners: List[str]
+    paths: List[str]
+    sources: List[str]
+
+    @classmethod
+    def from_files(cls, files: List[FileMetadata]) -> "FileTable":
+        """Build a table from a site's files.
+
+        Args:
+            files: Files in any order
+
+        Returns:
+            FileTable sorted by lowercase name
+        """
+        rows = sorted(files, key=attrgetter("name_lower"))
+        return cls(
+            names_lower=[f.name_lower for f in rows],
+            names=[f.name for f in rows],
+            urls=[f.web_url or "" for f in rows],
+            types=[f.display_type for f in rows],
+            created=[f.created_date_iso for f in rows],
+            modified=[f.modified_date_iso for f in rows],
+            owners=[f.created_by or f.last_modified_by or "" for f in rows],
+            paths=[f.path for f in rows],
+            sources=[f.source for f in rows],
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
 
 
 class FolderMetadata(BaseModel):
@@ -28,25 +102,21 @@ class FolderMetadata(BaseModel):
 
     id: str
     name: str
-    web_url: Optional[HttpUrl] = None
+    web_url: Optional[str] = None
     created_date_time: Optional[datetime] = None
     last_modified_date_time: Optional[datetime] = None
     child_count: int = 0
 
 
 class FolderNode(BaseModel):
-    """A folder node in the hierarchical structure."""
+    """A site's root folder; files are indexed as a flat list (no folder tree)."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, defer_build=True)
 
     folder: FolderMetadata
     files: List[FileMetadata] = []
-    subfolders: Dict[str, "FolderNode"] = {}
     path: str = ""
 
-    class Config:
-        """Pydantic config."""
-
-        arbitrary_types_allowed = True
-
 
 class SiteIndex(BaseModel):
     """Index for a SharePoint site."""
@@ -59,6 +129,9 @@ class SiteIndex(BaseModel):
     total_folders: int = 0
     total_size: int = 0
     last_indexed: Optional[datetime] = None
+    # Incremental indexing state, kept out of API responses
+    delta_links: Dict[str, str] = Field(default_factory=dict, exclude=True)  # Drive ID -> Graph delta link
+    folder_paths: Dict[str, str] = Field(default_factory=dict, exclude=True)  # Folder ID -> path, for delta changes
 
 
 class IndexStats(BaseModel):
@@ -1,12 +1,16 @@
 """Authentication routes for Microsoft SSO."""
 
-from typing import Optional
+from typing import Any, Dict, Optional
 from fastapi import APIRouter, Request, Response, HTTPException
 from fastapi.responses import RedirectResponse, HTMLResponse
 from app.services.auth_service import AuthService
 from app.utils.logger import setup_logger
+from app.utils.signing import make_token, verify_token
 from app.config import settings
+import base64
+import hmac
 import secrets
+import orjson
 
 logger = setup_logger(__name__)
 
@@ -16,37 +20,96 @@ router = APIRouter(prefix="/auth", tags=["authentication"])
 _auth_service: AuthService = None
 
 
-def get_auth_service() -> AuthService:
-    """Get or create auth service instance."""
+# Short-lived signed copy of the session user, checked on hot GET routes
+AUTH_COOKIE = "auth"
+AUTH_COOKIE_MAX_AGE = 300  # 5 minutes
+
+# How long a login attempt may take between /start and /callback
+OAUTH_STATE_MAX_AGE = 600  # 10 minutes
+
+# Nonce cookie binding the OAuth state to the browser that started the login
+OAUTH_STATE_COOKIE = "oauth_state"
+OAUTH_STATE_COOKIE_PATH = "/auth"
+
+# Signing purposes, so an auth cookie can't be replayed as OAuth state or vice versa
+_AUTH_PURPOSE = "auth"
+_STATE_PURPOSE = "state"
+
+
+def set_auth_cookie(response: Response, user: Dict[str, Any]) -> None:
+    """Attach a signed auth cookie for the user to a response.
+    
+    Args:
+        response: Response to set the cookie on
+        user: Session user info (email, name, id)
+    """
+    payload = base64.urlsafe_b64encode(orjson.dumps(user))
+    response.set_cookie(
+        AUTH_COOKIE,
+        make_token(payload.decode("ascii").rstrip("="), _AUTH_PURPOSE),
+        max_age=AUTH_COOKIE_MAX_AGE,
+        httponly=True,
+        samesite="lax",
+    )
+
+
+def read_auth_cookie(value: str) -> Optional[Dict[str, Any]]:
+    """Verify an auth cookie and return the user it carries.
+    
+    Args:
+        value: Raw cookie value
+        
+    Returns:
+        User info, or None if the cookie is invalid or expired
+    """
+    payload = verify_token(value, _AUTH_PURPOSE, AUTH_COOKIE_MAX_AGE)
+    if payload is None:
+        return None
+    try:
+        user = orjson.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except ValueError:
+        return None
+    return user if isinstance(user, dict) else None
+
+
+def init_auth_service() -> AuthService:
+    """Create the auth service instance (called from application startup)."""
     global _auth_service
+    _auth_service = AuthService()
+    return _auth_service
+
+
+async def close_auth_service() -> None:
+    """Release the auth service's HTTP connections (called from application shutdown)."""
+    if _auth_service is not None:
+        await _auth_service.aclose()
+
+
+def get_auth_service() -> AuthService:
+    """Get auth service instance, creating it if startup could not."""
     if _auth_service is None:
-        _auth_service = AuthService()
+        return init_auth_service()
     return _auth_service
 
 
-@router.get("/login", response_class=HTMLResponse)
-async def login_page(request: Request, error: Optional[str] = None) -> HTMLResponse:
-    """Display login page or redirect to Microsoft login.
+_LOGIN_ERRORS = {
+    "auth_failed": "Authentication failed. Please try again.",
+    "domain_not_allowed": f"Access restricted to @{settings.sso_allowed_domain} email addresses only.",
+    "invalid_state": "Invalid session. Please try again.",
+    "no_code": "No authorization code received. Please try again.",
+}
+
+
+def _render(error: Optional[str]) -> bytes:
+    """Render the login page for one error code.
     
     Args:
-        error: Optional error message to display
+        error: Error code from the query string, or None
         
     Returns:
-        HTML login page or redirect to Microsoft
+        Encoded HTML page
     """
-    # If already authenticated, redirect to home
-    if request.session.get("authenticated"):
-        return RedirectResponse(url="/", status_code=302)
-    
-    error_message = ""
-    if error == "auth_failed":
-        error_message = "Authentication failed. Please try again."
-    elif error == "domain_not_allowed":
-        error_message = f"Access restricted to @{settings.sso_allowed_domain} email addresses only."
-    elif error == "invalid_state":
-        error_message = "Invalid session. Please try again."
-    elif error == "no_code":
-        error_message = "No authorization code received. Please try again."
+    error_message = _LOGIN_ERRORS.get(error, "")
     
     html_content = f"""
     <!DOCTYPE html>
@@ -169,7 +232,29 @@ async def login_page(request: Request, error: Optional[str] = None) -> HTMLRespo
     </body>
     </html>
     """
-    return HTMLResponse(content=html_content)
+    return html_content.encode("utf-8")
+
+
+# Only the error banner varies, so every variant is rendered once up front
+_LOGIN_HTML: Dict[Optional[str], bytes] = {None: _render(None)}
+_LOGIN_HTML.update({error: _render(error) for error in _LOGIN_ERRORS})
+
+
+@router.get("/login", response_class=HTMLResponse)
+async def login_page(request: Request, error: Optional[str] = None) -> HTMLResponse:
+    """Display login page or redirect to Microsoft login.
+    
+    Args:
+        error: Optional error message to display
+        
+    Returns:
+        HTML login page or redirect to Microsoft
+    """
+    # If already authenticated, redirect to home
+    if request.session.get("authenticated"):
+        return RedirectResponse(url="/", status_code=302)
+    
+    return HTMLResponse(content=_LOGIN_HTML.get(error, _LOGIN_HTML[None]))
 
 
 @router.get("/start")
@@ -181,12 +266,13 @@ async def start_login(request: Request) -> RedirectResponse:
     """
     auth_service = get_auth_service()
     
-    # Generate state for CSRF protection
-    state = secrets.token_urlsafe(32)
-    request.session["auth_state"] = state
+    # Generate signed, timestamped state for CSRF protection (no session write);
+    # its nonce is also kept in a cookie so only this browser can complete the login
+    nonce = secrets.token_hex(16)
+    state = make_token(nonce, _STATE_PURPOSE)
     
     # Log for debugging
-    logger.info(f"Generated state: {state[:10]}... (stored in session)")
+    logger.info(f"Generated state: {state[:10]}...")
     
     # Get login URL
     login_url = auth_service.get_login_url(state=state)
@@ -194,9 +280,34 @@ async def start_login(request: Request) -> RedirectResponse:
     logger.info("Redirecting to Microsoft login")
     # Create response to ensure session cookie is set
     response = RedirectResponse(url=login_url, status_code=302)
+    response.set_cookie(
+        OAUTH_STATE_COOKIE,
+        nonce,
+        max_age=OAUTH_STATE_MAX_AGE,
+        path=OAUTH_STATE_COOKIE_PATH,
+        httponly=True,
+        samesite="lax",
+    )
     return response
 
 
+def _state_matches(request: Request, state: str) -> bool:
+    """Check OAuth state against the nonce cookie set by /start.
+    
+    Args:
+        request: Callback request carrying the nonce cookie
+        state: State parameter returned by Microsoft
+        
+    Returns:
+        True if the state is valid, unexpired and issued to this browser
+    """
+    nonce = verify_token(state, _STATE_PURPOSE, OAUTH_STATE_MAX_AGE)
+    cookie_nonce = request.cookies.get(OAUTH_STATE_COOKIE)
+    if nonce is None or not cookie_nonce:
+        return False
+    return hmac.compare_digest(nonce.encode("utf-8"), cookie_nonce.encode("utf-8"))
+
+
 @router.get("/callback")
 async def callback(request: Request, code: Optional[str] = None, state: Optional[str] = None, error: Optional[str] = None) -> RedirectResponse:
     """Handle Microsoft SSO callback.
@@ -206,6 +317,24 @@ async def callback(request: Request, code: Optional[str] = None, state: Optional
         state: State parameter for CSRF protection
         error: Error from Microsoft if authentication failed
         
+    Returns:
+        Redirect to home page or login page
+    """
+    response = await _complete_login(request, code, state, error)
+    # The state nonce is single-use, whatever the outcome
+    response.delete_cookie(OAUTH_STATE_COOKIE, path=OAUTH_STATE_COOKIE_PATH)
+    return response
+
+
+async def _complete_login(request: Request, code: Optional[str], state: Optional[str], error: Optional[str]) -> RedirectResponse:
+    """Validate the callback and sign the user in.
+    
+    Args:
+        request: Callback request
+        code: Authorization code from Microsoft
+        state: State parameter for CSRF protection
+        error: Error from Microsoft if authentication failed
+        
     Returns:
         Redirect to home page or login page
     """
@@ -217,25 +346,16 @@ async def callback(request: Request, code: Optional[str] = None, state: Optional
         return RedirectResponse(url="/auth/login?error=auth_failed", status_code=302)
     
     # Verify state
-    session_state = request.session.get("auth_state")
     logger.info(f"Callback received state: {state[:10] if state else 'None'}...")
-    logger.info(f"Session state: {session_state[:10] if session_state else 'None'}...")
     
     if not state:
         logger.error("No state parameter received from Microsoft")
         return RedirectResponse(url="/auth/login?error=invalid_state", status_code=302)
     
-    if not session_state:
-        logger.error("No state found in session - session may have expired or cookie not set")
+    if not _state_matches(request, state):
+        logger.error(f"Invalid or expired state: {state[:10]}...")
         return RedirectResponse(url="/auth/login?error=invalid_state", status_code=302)
     
-    if state != session_state:
-        logger.error(f"State mismatch - received: {state[:10]}..., expected: {session_state[:10]}...")
-        return RedirectResponse(url="/auth/login?error=invalid_state", status_code=302)
-    
-    # Clear state from session
-    request.session.pop("auth_state", None)
-    
     if not code:
         logger.error("No authorization code received")
         return RedirectResponse(url="/auth/login?error=no_code", status_code=302)
@@ -258,17 +378,20 @@ async def callback(request: Request, code: Optional[str] = None, state: Optional
             return RedirectResponse(url="/auth/login?error=domain_not_allowed", status_code=302)
         
         # Store user info in session
-        request.session["user"] = {
+        user = {
             "email": user_email,
             "name": user_info.get("displayName", ""),
             "id": user_info.get("id", ""),
         }
+        request.session["user"] = user
         request.session["authenticated"] = True
         
         logger.info(f"User authenticated: {user_email}")
         
         # Redirect to home
-        return RedirectResponse(url="/", status_code=302)
+        response = RedirectResponse(url="/", status_code=302)
+        set_auth_cookie(response, user)
+        return response
         
     except Exception as e:
         logger.error(f"Authentication failed: {e}", exc_info=True)
@@ -287,5 +410,7 @@ async def logout(request: Request) -> RedirectResponse:
     logger.info(f"User logged out: {user_email}")
     
     # Redirect to login page
-    return RedirectResponse(url="/auth/login", status_code=302)
+    response = RedirectResponse(url="/auth/login", status_code=302)
+    response.delete_cookie(AUTH_COOKIE)
+    return response
 
@@ -1,24 +1,39 @@
 """SharePoint API routes."""
 
-from typing import Optional, List, Dict, Any
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Body, Request, Depends
+from typing import Optional, List, Dict, Any, Callable, Iterable, Union
+from functools import lru_cache
+from bisect import bisect_left, bisect_right
+from itertools import islice, repeat
+import heapq
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Body, Request, Depends, Response
 from fastapi.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from app.services.sharepoint_service import SharePointService
 from app.services.index_service import IndexService
 from app.services.background_tasks import BackgroundTaskManager
-from app.models.index_models import IndexStatus, IndexStats
-from app.utils.pagination import paginate, PaginatedResponse
+from app.models.index_models import IndexStatus, IndexStats, SiteIndex, FileMetadata, FileTable
+from app.utils.pagination import (
+    CursorPaginatedResponse,
+    PaginatedResponse,
+    decode_page_token,
+    encode_page_token,
+    paginate_iterable,
+)
 from app.utils.logger import setup_logger
+from app.utils.responses import ORJSONResponse
 from app.config import settings
 
 logger = setup_logger(__name__)
 
-router = APIRouter(prefix="/api", tags=["sharepoint"])
+# Listing endpoints return large lists of dicts; encode them with orjson
+router = APIRouter(prefix="/api", tags=["sharepoint"], default_response_class=ORJSONResponse)
 
 
-def require_auth(request: Request):
-    """Dependency to require authentication for routes.
+async def ensure_authenticated(request: Request) -> None:
+    """Dependency to require authentication for routes that don't need the user.
+
+    Async so FastAPI runs it inline rather than in the threadpool.
     
     Args:
         request: FastAPI request object
@@ -28,38 +43,245 @@ def require_auth(request: Request):
     """
     if not request.session.get("authenticated"):
         raise HTTPException(status_code=401, detail="Authentication required")
-    return request.session.get("user")
 
-# Initialize services (singleton pattern)
-_sharepoint_service: Optional[SharePointService] = None
-_index_service: Optional[IndexService] = None
-_task_manager: Optional[BackgroundTaskManager] = None
 
+# Service providers (singletons, created on first use)
+@lru_cache(maxsize=1)
+def get_sharepoint_service() -> SharePointService:
+    """Get the shared SharePointService instance."""
+    return SharePointService()
+
+
+@lru_cache(maxsize=1)
+def get_index_service() -> IndexService:
+    """Get the shared IndexService instance."""
+    return IndexService()
+
+
+@lru_cache(maxsize=1)
+def get_task_manager() -> BackgroundTaskManager:
+    """Get the shared BackgroundTaskManager instance."""
+    return BackgroundTaskManager(get_sharepoint_service(), get_index_service())
+
+
+async def close_services() -> None:
+    """Release the services' HTTP connections and cached Graph token (called from application shutdown)."""
+    # Only services that were created hold connections
+    if get_sharepoint_service.cache_info().currsize:
+        await get_sharepoint_service().aclose()
+    if get_task_manager.cache_info().currsize:
+        await get_task_manager().email_service.aclose()
+    # The token and its lock are shared by every instance and tied to this event loop
+    SharePointService.reset_token_cache()
+
+
+# Route dependencies are async so FastAPI resolves them inline instead of in the threadpool
+async def sharepoint_service_dependency() -> SharePointService:
+    return get_sharepoint_service()
+
+
+async def index_service_dependency() -> IndexService:
+    return get_index_service()
+
+
+async def task_manager_dependency() -> BackgroundTaskManager:
+    return get_task_manager()
+
+
+def _format_file_row(file_meta: FileMetadata, site_name: str, file_path: str) -> Dict[str, Any]:
+    """Format a file as a row for the files/search table.
+
+    Display values are precomputed on FileMetadata, so this is plain attribute
+    reads on the per-row hot path.
+
+    Args:
+        file_meta: File to format
+        site_name: Name of the site the file belongs to
+        file_path: Path to display for the file
+
+    Returns:
+        Row dict as consumed by the frontend
+    """
+    return {
+        "name": file_meta.name,
+        "url": file_meta.web_url or "",
+        "type": file_meta.display_type,
+        "created_date": file_meta.created_date_iso,
+        "modified_date": file_meta.modified_date_iso,
+        "owner": file_meta.created_by or file_meta.last_modified_by or "",
+        "path": file_path,
+        "site_name": site_name,
+        "source": file_meta.source,  # "sharepoint" or "email"
+    }
+
+
+def _format_table_row(table: FileTable, position: int, site_name: str) -> Dict[str, Any]:
+    """Format one row of a site's FileTable like _format_file_row.
 
-def get_services() -> tuple[SharePointService, IndexService, BackgroundTaskManager]:
-    """Get or create service instances.
+    Args:
+        table: Site's file table
+        position: Row position in the table
+        site_name: Name of the site the file belongs to
 
     Returns:
-        Tuple of (SharePointService, IndexService, BackgroundTaskManager)
+        Row dict as consumed by the frontend
     """
-    global _sharepoint_service, _index_service, _task_manager
+    return {
+        "name": table.names[position],
+        "url": table.urls[position],
+        "type": table.types[position],
+        "created_date": table.created[position],
+        "modified_date": table.modified[position],
+        "owner": table.owners[position],
+        "path": table.paths[position],
+        "site_name": site_name,
+        "source": table.sources[position],
+    }
+
 
-    if _sharepoint_service is None:
-        _sharepoint_service = SharePointService()
-        _index_service = IndexService()
-        _task_manager = BackgroundTaskManager(_sharepoint_service, _index_service)
+# Page builders walk the in-memory index, so routes run them in the threadpool
+# to keep the event loop free for other requests
 
-    return _sharepoint_service, _index_service, _task_manager
 
+def _render_page(build: Callable[..., Union[PaginatedResponse, CursorPaginatedResponse]], *args: Any) -> bytes:
+    """Build a page and serialize it straight to JSON with orjson.
+
+    Args:
+        build: Page builder to call
+        *args: Arguments for the page builder
+
+    Returns:
+        JSON body for the response
+    """
+    return build(*args).to_json()
+
+
+def _build_index_page(index_service: IndexService, page: int, limit: int) -> PaginatedResponse:
+    """Build a page of site indexes."""
+    all_sites = index_service.get_all_sites()
+
+    # Convert to dict only the sites on the requested page
+    return paginate_iterable(
+        all_sites,
+        total=len(all_sites),
+        page=page,
+        page_size=limit,
+        max_page_size=settings.max_page_size,
+        transform=SiteIndex.model_dump,
+    )
 
-@router.get("/sites/discover")
-async def discover_sites(user: Dict = Depends(require_auth)) -> Dict[str, Any]:
+
+def _build_files_page(
+    index_service: IndexService, site_id: Optional[str], page: int, limit: int
+) -> PaginatedResponse:
+    """Build a page of the name-sorted file listing."""
+    # Merge the per-site name-sorted tables (all sites or a specific site)
+    tables = [
+        (site_index.site_name, index_service.get_file_table(site_index.site_id))
+        for site_index in index_service.get_all_sites()
+        if not site_id or site_index.site_id == site_id
+    ]
+    # (name_lower, table number, row) tuples order like a stable merge on name_lower
+    sorted_rows = heapq.merge(
+        *(
+            zip(table.names_lower, repeat(table_number), range(len(table)))
+            for table_number, (_, table) in enumerate(tables)
+        )
+    )
+
+    def to_row(entry: tuple[str, int, int]) -> Dict[str, Any]:
+        _, table_number, position = entry
+        site_name, table = tables[table_number]
+        return _format_table_row(table, position, site_name)
+
+    return paginate_iterable(
+        sorted_rows,
+        total=index_service.count_files(site_id),
+        page=page,
+        page_size=limit,
+        max_page_size=settings.max_page_size,
+        transform=to_row,
+    )
+
+
+def _build_files_cursor_page(
+    index_service: IndexService, site_id: Optional[str], after: Optional[List[Any]], limit: int
+) -> CursorPaginatedResponse:
+    """Build a page of the name-sorted file listing that starts after a sort key."""
+    limit = min(max(1, limit), settings.max_page_size)
+    # Ties on name_lower break on site ID (then table row), so the order doesn't
+    # depend on which sites happen to be indexed
+    tables = sorted(
+        (site_index.site_id, site_index.site_name, index_service.get_file_table(site_index.site_id))
+        for site_index in index_service.get_all_sites()
+        if not site_id or site_index.site_id == site_id
+    )
+
+    def rows_after(table_site_id: str, table: FileTable) -> Iterable[tuple[str, str, int]]:
+        """(name_lower, site ID, row) for the table's rows that sort after the token."""
+        names = table.names_lower
+        start = 0
+        if after:
+            name, after_site_id, after_row = after
+            # Each table is sorted by name_lower, so the resume point is found by bisection
+            lo, hi = bisect_left(names, name), bisect_right(names, name)
+            if table_site_id < after_site_id:
+                start = hi
+            elif table_site_id > after_site_id:
+                start = lo
+            else:
+                start = min(max(after_row + 1, lo), hi)
+        rows = range(start, len(names))
+        return zip(map(names.__getitem__, rows), repeat(table_site_id), rows)
+
+    sorted_rows = heapq.merge(*(rows_after(table_site_id, table) for table_site_id, _, table in tables))
+    # One extra row tells whether there is a next page
+    window = list(islice(sorted_rows, limit + 1))
+    has_next = len(window) > limit
+    del window[limit:]
+
+    tables_by_site = {table_site_id: (site_name, table) for table_site_id, site_name, table in tables}
+    items = []
+    for _, table_site_id, position in window:
+        site_name, table = tables_by_site[table_site_id]
+        items.append(_format_table_row(table, position, site_name))
+
+    return CursorPaginatedResponse(
+        items=items,
+        page_size=limit,
+        next_token=encode_page_token(window[-1]) if has_next else None,
+        has_next=has_next,
+    )
+
+
+def _build_search_page(index_service: IndexService, q: str, page: int, limit: int) -> PaginatedResponse:
+    """Build a page of search results."""
+    results = index_service.search_files(q, limit=limit * page)  # Get enough for pagination
+
+    # Format only the results on the requested page with table data
+    def to_row(result: tuple[SiteIndex, FileMetadata, str]) -> Dict[str, Any]:
+        site_index, file_meta, file_path = result
+        return _format_file_row(file_meta, site_index.site_name, file_path)
+
+    return paginate_iterable(
+        results,
+        total=len(results),
+        page=page,
+        page_size=limit,
+        max_page_size=settings.max_page_size,
+        transform=to_row,
+    )
+
+
+@router.get("/sites/discover", dependencies=[Depends(ensure_authenticated)])
+async def discover_sites(
+    sharepoint_service: SharePointService = Depends(sharepoint_service_dependency),
+) -> Dict[str, Any]:
     """Discover all SharePoint sites without indexing them.
 
     Returns:
         List of available SharePoint sites
     """
-    sharepoint_service, _, _ = get_services()
 
     try:
         sites = await sharepoint_service.get_all_sites()
@@ -97,10 +319,10 @@ class RefreshRequest(BaseModel):
     sites: Optional[List[SiteConfig]] = None  # New format with options
 
 
-@router.post("/refresh")
+@router.post("/refresh", dependencies=[Depends(ensure_authenticated)])
 async def refresh_index(
     background_tasks: BackgroundTasks,
-    user: Dict = Depends(require_auth),
+    task_manager: BackgroundTaskManager = Depends(task_manager_dependency),
     request: Optional[RefreshRequest] = Body(default=None),
 ) -> Dict[str, Any]:
     """Trigger a SharePoint index refresh for selected sites.
@@ -111,7 +333,6 @@ async def refresh_index(
     Returns:
         Job ID and status
     """
-    _, _, task_manager = get_services()
 
     try:
         # Support both old format (site_ids) and new format (sites with options)
@@ -137,11 +358,16 @@ async def refresh_index(
         raise HTTPException(status_code=500, detail=f"Failed to start indexing: {str(e)}")
 
 
-@router.get("/status", response_model=IndexStatus)
+@router.get(
+    "/status",
+    response_class=Response,
+    responses={200: {"model": IndexStatus}},
+    dependencies=[Depends(ensure_authenticated)],
+)
 async def get_indexing_status(
     job_id: Optional[str] = Query(None),
-    user: Dict = Depends(require_auth),
-) -> IndexStatus:
+    task_manager: BackgroundTaskManager = Depends(task_manager_dependency),
+) -> Response:
     """Get the status of an indexing job.
 
     Args:
@@ -150,21 +376,26 @@ async def get_indexing_status(
     Returns:
         IndexStatus with current progress
     """
-    _, _, task_manager = get_services()
 
     status = task_manager.get_status(job_id)
     if not status:
         raise HTTPException(status_code=404, detail="Job not found or no active job")
 
-    return status
+    # Already a validated model: serialize it directly instead of re-validating
+    return Response(content=status.model_dump_json(), media_type="application/json")
 
 
-@router.get("/index", response_model=PaginatedResponse)
+@router.get(
+    "/index",
+    response_class=Response,
+    responses={200: {"model": PaginatedResponse}},
+    dependencies=[Depends(ensure_authenticated)],
+)
 async def get_index(
     page: int = Query(1, ge=1),
     limit: int = Query(None, ge=1, le=settings.max_page_size),
-    user: Dict = Depends(require_auth),
-) -> PaginatedResponse:
+    index_service: IndexService = Depends(index_service_dependency),
+) -> Response:
     """Get the current index structure (paginated).
 
     Args:
@@ -174,35 +405,41 @@ async def get_index(
     Returns:
         Paginated list of site indexes
     """
-    _, index_service, _ = get_services()
 
     limit = limit or settings.default_page_size
-    all_sites = index_service.get_all_sites()
-
-    # Convert to dict for pagination
-    sites_data = [site.model_dump() for site in all_sites]
-
-    return paginate(sites_data, page=page, page_size=limit, max_page_size=settings.max_page_size)
-
-
-@router.get("/index/stats", response_model=IndexStats)
-async def get_index_stats(user: Dict = Depends(require_auth)) -> IndexStats:
+    body = await run_in_threadpool(_render_page, _build_index_page, index_service, page, limit)
+    return Response(content=body, media_type="application/json")
+
+
+@router.get(
+    "/index/stats",
+    response_class=Response,
+    responses={200: {"model": IndexStats}},
+    dependencies=[Depends(ensure_authenticated)],
+)
+async def get_index_stats(
+    index_service: IndexService = Depends(index_service_dependency),
+) -> Response:
     """Get statistics about the current index.
 
     Returns:
         IndexStats with aggregated statistics
     """
-    _, index_service, _ = get_services()
-    return index_service.get_stats()
+    return Response(content=index_service.get_stats().model_dump_json(), media_type="application/json")
 
 
-@router.get("/files", response_model=PaginatedResponse)
+@router.get(
+    "/files",
+    response_class=Response,
+    responses={200: {"model": PaginatedResponse}},
+    dependencies=[Depends(ensure_authenticated)],
+)
 async def get_all_files(
     page: int = Query(1, ge=1),
     limit: int = Query(None, ge=1, le=settings.max_page_size),
     site_id: Optional[str] = Query(None, description="Filter by site ID"),
-    user: Dict = Depends(require_auth),
-) -> PaginatedResponse:
+    index_service: IndexService = Depends(index_service_dependency),
+) -> Response:
     """Get all files (name and link only) for fast listing.
 
     Args:
@@ -213,48 +450,66 @@ async def get_all_files(
     Returns:
         Paginated file list with minimal data
     """
-    _, index_service, _ = get_services()
 
     limit = limit or settings.default_page_size
-    all_files = []
 
-    # Collect all files from all sites (or specific site)
-    for site_index in index_service.get_all_sites():
-        if site_id and site_index.site_id != site_id:
-            continue
-        
-        for file_meta in site_index.root_folder.files:
-            file_path = file_meta.path if hasattr(file_meta, 'path') and file_meta.path else ""
-            file_type = getattr(file_meta, 'file_type', '')
-            if not file_type and file_meta.name and '.' in file_meta.name:
-                file_type = file_meta.name.split('.')[-1].upper()
-            
-            source = getattr(file_meta, 'source', 'sharepoint')
-            all_files.append({
-                "name": file_meta.name,
-                "url": str(file_meta.web_url) if file_meta.web_url else "",
-                "type": file_type,
-                "created_date": file_meta.created_date_time.isoformat() if file_meta.created_date_time else "",
-                "modified_date": file_meta.last_modified_date_time.isoformat() if file_meta.last_modified_date_time else "",
-                "owner": file_meta.created_by or file_meta.last_modified_by or "",
-                "path": file_path,
-                "site_name": site_index.site_name,
-                "source": source,  # "sharepoint" or "email"
-            })
-
-    # Sort by name for consistent ordering
-    all_files.sort(key=lambda x: x["name"].lower())
-
-    return paginate(all_files, page=page, page_size=limit, max_page_size=settings.max_page_size)
-
-
-@router.get("/search", response_model=PaginatedResponse)
+    body = await run_in_threadpool(_render_page, _build_files_page, index_service, site_id, page, limit)
+    return Response(content=body, media_type="application/json")
+
+
+@router.get(
+    "/files/cursor",
+    response_class=Response,
+    responses={200: {"model": CursorPaginatedResponse}},
+    dependencies=[Depends(ensure_authenticated)],
+)
+async def get_all_files_by_cursor(
+    page_token: Optional[str] = Query(None, description="next_token of the previous page (omit for the first page)"),
+    limit: int = Query(None, ge=1, le=settings.max_page_size),
+    site_id: Optional[str] = Query(None, description="Filter by site ID"),
+    index_service: IndexService = Depends(index_service_dependency),
+) -> Response:
+    """Get all files sorted by name like /files, paged by cursor.
+
+    Prefer this over /files for walking the whole listing: each page resumes
+    after the previous one by bisection instead of skipping page * limit rows,
+    and rows don't shift between pages when the index changes. Use /files when
+    jumping to a page number or showing a total.
+
+    Args:
+        page_token: Token of the page to fetch (next_token of the previous page)
+        limit: Items per page
+        site_id: Optional site ID to filter files
+
+    Returns:
+        Cursor-paginated file list with minimal data
+    """
+    after = None
+    if page_token:
+        after = decode_page_token(page_token)
+        if not (
+            after and len(after) == 3
+            and isinstance(after[0], str) and isinstance(after[1], str) and isinstance(after[2], int)
+        ):
+            raise HTTPException(status_code=400, detail="Invalid page token")
+
+    limit = limit or settings.default_page_size
+    body = await run_in_threadpool(_render_page, _build_files_cursor_page, index_service, site_id, after, limit)
+    return Response(content=body, media_type="application/json")
+
+
+@router.get(
+    "/search",
+    response_class=Response,
+    responses={200: {"model": PaginatedResponse}},
+    dependencies=[Depends(ensure_authenticated)],
+)
 async def search_files(
     q: str = Query(..., min_length=1, description="Search query"),
     page: int = Query(1, ge=1),
     limit: int = Query(None, ge=1, le=settings.max_page_size),
-    user: Dict = Depends(require_auth),
-) -> PaginatedResponse:
+    index_service: IndexService = Depends(index_service_dependency),
+) -> Response:
     """Search for files across all indexed sites (name and link only).
 
     Args:
@@ -265,38 +520,16 @@ async def search_files(
     Returns:
         Paginated search results with minimal data
     """
-    _, index_service, _ = get_services()
 
     limit = limit or settings.default_page_size
-    results = index_service.search_files(q, limit=limit * page)  # Get enough for pagination
+    body = await run_in_threadpool(_render_page, _build_search_page, index_service, q, page, limit)
+    return Response(content=body, media_type="application/json")
 
-    # Format results with table data
-    formatted_results = []
-    for site_index, file_meta, file_path in results:
-        file_type = getattr(file_meta, 'file_type', '')
-        if not file_type and file_meta.name and '.' in file_meta.name:
-            file_type = file_meta.name.split('.')[-1].upper()
-        
-        source = getattr(file_meta, 'source', 'sharepoint')
-        formatted_results.append({
-            "name": file_meta.name,
-            "url": str(file_meta.web_url) if file_meta.web_url else "",
-            "type": file_type,
-            "created_date": file_meta.created_date_time.isoformat() if file_meta.created_date_time else "",
-            "modified_date": file_meta.last_modified_date_time.isoformat() if file_meta.last_modified_date_time else "",
-            "owner": file_meta.created_by or file_meta.last_modified_by or "",
-            "path": file_path,
-            "site_name": site_index.site_name,
-            "source": source,  # "sharepoint" or "email"
-        })
-
-    return paginate(formatted_results, page=page, page_size=limit, max_page_size=settings.max_page_size)
-
-
-@router.post("/cancel")
+
+@router.post("/cancel", dependencies=[Depends(ensure_authenticated)])
 async def cancel_indexing(
     job_id: Optional[str] = Query(None),
-    user: Dict = Depends(require_auth),
+    task_manager: BackgroundTaskManager = Depends(task_manager_dependency),
 ) -> Dict[str, Any]:
     """Cancel an indexing job.
 
@@ -306,7 +539,6 @@ async def cancel_indexing(
     Returns:
         Cancellation status
     """
-    _, _, task_manager = get_services()
 
     try:
         cancelled = await task_manager.cancel_indexing(job_id)
@@ -322,8 +554,11 @@ async def cancel_indexing(
         raise HTTPException(status_code=500, detail=f"Failed to cancel indexing: {str(e)}")
 
 
-@router.post("/clear-all")
-async def clear_all(user: Dict = Depends(require_auth)) -> Dict[str, Any]:
+@router.post("/clear-all", dependencies=[Depends(ensure_authenticated)])
+async def clear_all(
+    index_service: IndexService = Depends(index_service_dependency),
+    task_manager: BackgroundTaskManager = Depends(task_manager_dependency),
+) -> Dict[str, Any]:
     """Clear all indexed data and stop all processes.
 
     This will:
@@ -334,7 +569,6 @@ async def clear_all(user: Dict = Depends(require_auth)) -> Dict[str, Any]:
     Returns:
         Status of the operation
     """
-    _, index_service, task_manager = get_services()
 
     try:
         # Cancel any ongoing indexing
@@ -1,10 +1,14 @@
 """Authentication service for Microsoft SSO."""
 
+import asyncio
 import secrets
 from typing import Optional, Dict, Any
-from urllib.parse import urlencode
+from urllib.parse import quote, urlencode
+import httpx
+import orjson
 from msal import ConfidentialClientApplication, PublicClientApplication
 from app.config import settings
+from app.utils.http import HTTP2_AVAILABLE
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -16,10 +20,12 @@ class AuthService:
     def __init__(self):
         """Initialize the authentication service."""
         self.authority = f"https://login.microsoftonline.com/{settings.azure_tenant_id}"
+        self._authorize_endpoint = f"{self.authority}/oauth2/v2.0/authorize"
         self.client_id = settings.azure_client_id
         self.client_secret = settings.azure_client_secret
         self.redirect_uri = settings.sso_redirect_uri or "http://localhost:8000/auth/callback"
         self.allowed_domain = settings.sso_allowed_domain.lower()
+        self._allowed_suffix = f"@{self.allowed_domain}"
         
         # Scopes for user authentication
         # Note: MSAL automatically adds 'openid', 'profile', and 'offline_access'
@@ -35,6 +41,27 @@ class AuthService:
             authority=self.authority,
         )
 
+        # Shared Graph client, created on first use so connections are reused across logins
+        self._graph_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def graph_client(self) -> httpx.AsyncClient:
+        """Get the shared Microsoft Graph HTTP client."""
+        if self._graph_client is None or self._graph_client.is_closed:
+            self._graph_client = httpx.AsyncClient(
+                base_url="https://graph.microsoft.com/v1.0",
+                http2=HTTP2_AVAILABLE,
+                timeout=5.0,
+                limits=httpx.Limits(max_keepalive_connections=32),
+            )
+        return self._graph_client
+
+    async def aclose(self) -> None:
+        """Close the shared Graph client."""
+        if self._graph_client is not None:
+            await self._graph_client.aclose()
+            self._graph_client = None
+
     def get_login_url(self, state: Optional[str] = None) -> str:
         """Generate Microsoft login URL.
         
@@ -51,17 +78,16 @@ class AuthService:
         # We need to include them in the authorization URL for proper OAuth flow
         scopes_for_url = self.scopes + ["openid", "profile"]
         
-        auth_url = (
-            f"{self.authority}/oauth2/v2.0/authorize?"
-            f"client_id={self.client_id}&"
-            f"response_type=code&"
-            f"redirect_uri={self.redirect_uri}&"
-            f"response_mode=query&"
-            f"scope={' '.join(scopes_for_url)}&"
-            f"state={state}"
-        )
+        params = {
+            "client_id": self.client_id,
+            "response_type": "code",
+            "redirect_uri": self.redirect_uri,
+            "response_mode": "query",
+            "scope": " ".join(scopes_for_url),
+            "state": state,
+        }
         
-        return auth_url
+        return f"{self._authorize_endpoint}?{urlencode(params, quote_via=quote)}"
 
     async def acquire_token_by_code(self, code: str) -> Dict[str, Any]:
         """Exchange authorization code for access token.
@@ -73,7 +99,9 @@ class AuthService:
             Token response with user info
         """
         try:
-            result = self._msal_app.acquire_token_by_authorization_code(
+            # MSAL is synchronous and makes network calls, so keep it off the loop
+            result = await asyncio.to_thread(
+                self._msal_app.acquire_token_by_authorization_code,
                 code=code,
                 scopes=self.scopes,
                 redirect_uri=self.redirect_uri,
@@ -100,10 +128,11 @@ class AuthService:
         if not email:
             return False
         
-        email_lower = email.lower()
-        allowed_domain = f"@{self.allowed_domain}"
+        # Graph normally returns lowercase addresses, so skip the copy when we can
+        if not email.islower():
+            email = email.lower()
         
-        return email_lower.endswith(allowed_domain)
+        return email.endswith(self._allowed_suffix)
 
     async def get_user_info(self, access_token: str) -> Dict[str, Any]:
         """Get user information from Microsoft Graph API.
@@ -114,13 +143,10 @@ class AuthService:
         Returns:
             User information dictionary
         """
-        import httpx
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://graph.microsoft.com/v1.0/me",
-                headers={"Authorization": f"Bearer {access_token}"},
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self.graph_client.get(
+            "/me",
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+        response.raise_for_status()
+        return orjson.loads(response.content)
 
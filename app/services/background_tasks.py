@@ -2,16 +2,129 @@
 
 import uuid
 import asyncio
-from datetime import datetime
-from typing import Dict, Optional
+from bisect import bisect_right
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from cachetools import TTLCache
 from app.services.sharepoint_service import SharePointService
 from app.services.email_service import EmailService
 from app.services.index_service import IndexService
 from app.models.index_models import IndexStatus, SiteIndex, FileMetadata, FolderNode, FolderMetadata
 from app.utils.logger import setup_logger
+from app.config import settings
 
 logger = setup_logger(__name__)
 
+# How often a running job copies its progress counters into its status
+PROGRESS_PUBLISH_INTERVAL = 0.2  # seconds
+
+# Job states after which a job no longer runs
+_TERMINAL_STATES: frozenset[str] = frozenset(("completed", "failed", "cancelled"))
+
+# What to index for sites missing from the job's sites_config
+_DEFAULT_SITE_CONFIG: Mapping[str, bool] = MappingProxyType({"index_sharepoint": True, "index_email": True})
+
+# Finished jobs are kept for status lookups, up to this many and for this long
+FINISHED_JOBS_MAX_SIZE = 256
+FINISHED_JOBS_TTL_SECONDS = 3600
+
+# Site owners looked up at once (each lookup is a Graph call or two)
+OWNER_LOOKUP_CONCURRENCY = 8
+
+
+@dataclass(slots=True, frozen=True)
+class _SiteRef:
+    """A site to index, with the fields the indexing loop reads pulled out once."""
+
+    id: Optional[str]
+    name: str
+    url: str
+    raw: Dict[str, Any]  # Graph site object, for owner lookup
+
+    @classmethod
+    def from_graph(cls, site: Dict[str, Any]) -> "_SiteRef":
+        """Build a reference from a Graph site object."""
+        return cls(
+            id=site.get("id"),
+            name=site.get("name", site.get("displayName", "Unknown")),
+            url=site.get("webUrl", ""),
+            raw=site,
+        )
+
+
+class _UserDirectory:
+    """Directory users laid out for matching site names against them.
+
+    The lowercased display names and mail addresses are each joined into one
+    NUL-separated string, so finding the first user whose field contains a
+    site name is a single str.find instead of a scan over every user.
+    """
+
+    def __init__(self, users: Iterable[Dict[str, Any]]):
+        """Build the lookup from Graph user objects.
+
+        Args:
+            users: Users as returned by EmailService.get_all_users
+        """
+        display_lower: List[str] = []
+        mail_lower: List[str] = []
+        # (display name, mail, user principal name)
+        self.users: List[Tuple[str, str, str]] = []
+        for user in users:
+            display_lower.append((user.get("displayName") or "").lower())
+            mail_lower.append((user.get("mail") or "").lower())
+            self.users.append((
+                user.get("displayName", ""),
+                user.get("mail", ""),
+                user.get("userPrincipalName", ""),
+            ))
+        self._display_text, self._display_starts = self._join(display_lower)
+        self._mail_text, self._mail_starts = self._join(mail_lower)
+
+    @staticmethod
+    def _join(values: List[str]) -> Tuple[str, List[int]]:
+        """Join values with NULs, returning the text and each value's offset."""
+        starts = []
+        offset = 0
+        for value in values:
+            starts.append(offset)
+            offset += len(value) + 1
+        return "\0".join(values), starts
+
+    @staticmethod
+    def _first(text: str, starts: List[int], needle: str) -> Optional[int]:
+        """Position of the first value containing needle, or None."""
+        if not needle or "\0" in needle:
+            return None
+        offset = text.find(needle)
+        if offset < 0:
+            return None
+        return bisect_right(starts, offset) - 1
+
+    def match_site_name(self, site_name: str) -> Optional[Tuple[bool, Tuple[str, str, str]]]:
+        """Find the first user whose display name contains the site name, or
+        whose mail contains it with spaces replaced by dots.
+
+        Args:
+            site_name: Site display name
+
+        Returns:
+            Tuple of (matched on display name, (display name, mail, user principal name)),
+            or None if no user matches
+        """
+        site_name_lower = site_name.lower()
+        by_display = self._first(self._display_text, self._display_starts, site_name_lower)
+        by_mail = self._first(self._mail_text, self._mail_starts, site_name_lower.replace(" ", "."))
+        # Users are checked in directory order, display name before mail
+        if by_display is not None and (by_mail is None or by_display <= by_mail):
+            return True, self.users[by_display]
+        if by_mail is not None:
+            return False, self.users[by_mail]
+        return None
+
 
 class BackgroundTaskManager:
     """Manager for background indexing tasks."""
@@ -26,12 +139,37 @@ class BackgroundTaskManager:
         self.sharepoint_service = sharepoint_service
         self.email_service = EmailService()
         self.index_service = index_service
+        # Jobs that are queued or running; finished jobs move to a bounded cache
         self._jobs: Dict[str, IndexStatus] = {}
+        self._finished_jobs: TTLCache = TTLCache(
+            maxsize=FINISHED_JOBS_MAX_SIZE,
+            ttl=FINISHED_JOBS_TTL_SECONDS,
+        )
         self._current_job_id: Optional[str] = None
-        self._selected_site_ids: Optional[list[str]] = None
+        self._selected_site_ids: Optional[frozenset[str]] = None
         self._sites_config: Optional[Dict[str, Dict[str, bool]]] = None  # site_id -> {index_sharepoint: bool, index_email: bool}
         self._current_status: Optional[IndexStatus] = None
-        self._cancelled: bool = False
+        # Per-job cancellation: an event the indexing loops check, and the site tasks to cancel
+        self._cancel_events: Dict[str, asyncio.Event] = {}
+        self._site_tasks: Dict[str, set[asyncio.Task]] = {}
+        # Bounds how many jobs talk to Graph at once; later jobs wait for a slot
+        self._indexing_slots = asyncio.Semaphore(max(1, settings.max_concurrent_indexing))
+        self._active_job_ids: set[str] = set()
+        # Index updates run off the event loop, one at a time across all jobs
+        self._index_writes = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-writer")
+
+    def _get_job(self, job_id: str) -> Optional[IndexStatus]:
+        """Get a job's status, whether it is still running or has finished."""
+        status = self._jobs.get(job_id)
+        if status is None:
+            status = self._finished_jobs.get(job_id)
+        return status
+
+    def _archive_job(self, job_id: str) -> None:
+        """Move a job that will not run any more into the finished jobs cache."""
+        status = self._jobs.pop(job_id, None)
+        if status is not None:
+            self._finished_jobs[job_id] = status
 
     def get_status(self, job_id: Optional[str] = None) -> Optional[IndexStatus]:
         """Get status of an indexing job.
@@ -48,11 +186,11 @@ class BackgroundTaskManager:
         if job_id is None:
             return None
 
-        status = self._jobs.get(job_id)
+        status = self._get_job(job_id)
         
         # If job is completed/failed/cancelled and it's not the current job, return None
         # This prevents stale completed jobs from blocking new operations
-        if status and status.status in ['completed', 'failed', 'cancelled']:
+        if status and status.status in _TERMINAL_STATES:
             if job_id != self._current_job_id:
                 return None
         
@@ -68,14 +206,26 @@ class BackgroundTaskManager:
         Returns:
             Job ID
         """
+        selected_site_ids = frozenset(site_ids) if site_ids else None
+
+        # Reuse a running job for the same selection instead of queueing a duplicate
+        current = self._jobs.get(self._current_job_id) if self._current_job_id else None
+        if (
+            current
+            and current.status == "running"
+            and selected_site_ids == self._selected_site_ids
+            and sites_config == self._sites_config
+        ):
+            logger.info(f"Indexing job {current.job_id} is already running for the same sites - reusing it")
+            return current.job_id
+
         # Cancel any existing job
         if self._current_job_id:
             await self.cancel_indexing(self._current_job_id)
 
         # Store selected site IDs and configuration
-        self._selected_site_ids = site_ids
+        self._selected_site_ids = selected_site_ids
         self._sites_config = sites_config
-        self._cancelled = False
 
         # Create new job
         job_id = str(uuid.uuid4())
@@ -83,9 +233,10 @@ class BackgroundTaskManager:
             job_id=job_id,
             status="running",
             progress=0.0,
-            started_at=datetime.now(),
+            started_at=datetime.now(timezone.utc),
         )
         self._jobs[job_id] = status
+        self._cancel_events[job_id] = asyncio.Event()
         self._current_job_id = job_id
 
         logger.info(f"Started indexing job {job_id} with {len(site_ids) if site_ids else 'all'} sites")
@@ -110,10 +261,23 @@ class BackgroundTaskManager:
 
         status = self._jobs.get(job_id)
         if status and status.status == "running":
-            self._cancelled = True
             status.status = "cancelled"
-            status.completed_at = datetime.now()
+            status.completed_at = datetime.now(timezone.utc)
             status.error_message = "Indexing cancelled by user"
+
+            cancel_event = self._cancel_events.get(job_id)
+            if cancel_event:
+                cancel_event.set()
+            # Interrupt sites that are mid-request and wait for them to unwind
+            site_tasks = list(self._site_tasks.get(job_id, ()))
+            for task in site_tasks:
+                task.cancel()
+            if site_tasks:
+                await asyncio.gather(*site_tasks, return_exceptions=True)
+            # A job that never got to run won't archive itself
+            if job_id not in self._active_job_ids:
+                self._archive_job(job_id)
+
             logger.info(f"Cancelled indexing job {job_id}")
             return True
 
@@ -125,43 +289,114 @@ class BackgroundTaskManager:
         This is used when clearing all data to ensure a clean state.
         """
         logger.info("Resetting background task manager state")
-        self._cancelled = False
         self._current_job_id = None
         self._selected_site_ids = None
         self._sites_config = None
         self._current_status = None
         self._jobs.clear()
-        # Also reset the cancelled flag in sharepoint service
-        if hasattr(self.sharepoint_service, '_cancelled'):
-            self.sharepoint_service._cancelled = False
+        self._finished_jobs.clear()
+        self._cancel_events.clear()
+        self._site_tasks.clear()
         logger.info("Background task manager reset complete")
 
     async def run_indexing(self, job_id: str) -> None:
-        """Run the actual indexing process.
+        """Run an indexing job once an indexing slot is free.
 
         Args:
             job_id: Job ID
         """
-        status = self._jobs.get(job_id)
+        status = self._get_job(job_id)
         if not status:
             logger.error(f"Job {job_id} not found")
             return
 
+        # start_indexing may hand back a job that is already scheduled
+        if job_id in self._active_job_ids:
+            logger.debug(f"Indexing job {job_id} is already scheduled")
+            return
+
+        self._active_job_ids.add(job_id)
+        try:
+            async with self._indexing_slots:
+                # The job may have been cancelled or replaced while waiting
+                if status.status != "running":
+                    logger.info(f"Indexing job {job_id} was {status.status} before it started")
+                    return
+                cancel_event = self._cancel_events.setdefault(job_id, asyncio.Event())
+                await self._run_job(job_id, status, cancel_event)
+        finally:
+            self._active_job_ids.discard(job_id)
+            self._archive_job(job_id)
+            self._cancel_events.pop(job_id, None)
+            self._site_tasks.pop(job_id, None)
+
+    async def _update_index(self, site_indexes: List[SiteIndex]) -> None:
+        """Merge site indexes into the index on the index writer thread."""
+        await asyncio.get_running_loop().run_in_executor(
+            self._index_writes, self.index_service.update_index, site_indexes
+        )
+
+    async def _index_writer(self, save_queue: "asyncio.Queue[Optional[List[SiteIndex]]]") -> None:
+        """Save queued site indexes in a worker thread until None is queued.
+
+        Sites that queue up while a save is running are merged in one batch.
+
+        Args:
+            save_queue: Queue of finished site indexes (None = stop)
+        """
+        stopping = False
+        while not stopping:
+            batch = await save_queue.get()
+            if batch is None:
+                break
+            while not save_queue.empty():
+                more = save_queue.get_nowait()
+                if more is None:
+                    stopping = True
+                    break
+                batch.extend(more)
+
+            try:
+                await self._update_index(batch)
+                logger.debug(f"Incremental save: {len(batch)} sites saved to index")
+            except Exception as e:
+                logger.error(f"Failed to save {len(batch)} sites to index: {e}", exc_info=True)
+
+    async def _run_job(self, job_id: str, status: IndexStatus, cancel_event: asyncio.Event) -> None:
+        """Run the actual indexing process.
+
+        Args:
+            job_id: Job ID
+            status: Status of the job, updated as indexing progresses
+            cancel_event: Set when the job is cancelled
+        """
         try:
             status.status = "running"
             status.progress = 0.0
 
             # Get sites to index
-            logger.info("Fetching SharePoint sites...")
-            all_sites = await self.sharepoint_service.get_all_sites()
-            
-            # Filter to selected sites if provided
-            if self._selected_site_ids:
-                sites = [s for s in all_sites if s.get("id") in self._selected_site_ids]
-                logger.info(f"Indexing {len(sites)} selected sites out of {len(all_sites)} total")
-            else:
-                sites = all_sites
-                logger.info(f"Indexing all {len(sites)} sites")
+            selected_site_ids = self._selected_site_ids
+            sites = None
+            if selected_site_ids and not settings.sharepoint_site_ids:
+                # Fetch just the selected sites instead of enumerating the whole tenant
+                logger.info(f"Fetching {len(selected_site_ids)} selected SharePoint sites...")
+                try:
+                    sites = await self.sharepoint_service.get_sites_by_ids(sorted(selected_site_ids))
+                    logger.info(f"Indexing {len(sites)} selected sites")
+                except Exception as e:
+                    logger.warning(f"Batch site lookup failed, falling back to full site list: {e}")
+
+            if sites is None:
+                logger.info("Fetching SharePoint sites...")
+                all_sites = await self.sharepoint_service.get_all_sites()
+                
+                # Filter to selected sites if provided
+                if selected_site_ids:
+                    sites = [s for s in all_sites if s.get("id") in selected_site_ids]
+                    logger.info(f"Indexing {len(sites)} selected sites out of {len(all_sites)} total")
+                else:
+                    sites = all_sites
+                    logger.info(f"Indexing all {len(sites)} sites")
             
             status.total_sites = len(sites)
 
@@ -169,72 +404,145 @@ class BackgroundTaskManager:
                 logger.warning("No SharePoint sites found")
                 status.status = "completed"
                 status.progress = 1.0
-                status.completed_at = datetime.now()
+                status.completed_at = datetime.now(timezone.utc)
                 return
 
             # Index each site
             site_indexes = []
             files_processed = 0
+            current_folder: Optional[str] = None
 
             def progress_callback(folder_path: Optional[str] = None):
-                """Callback for progress updates."""
-                nonlocal files_processed
+                """Callback for progress updates (published to status by publish_progress)."""
+                nonlocal files_processed, current_folder
                 files_processed += 1
-                status.files_processed = files_processed
                 if folder_path:
-                    status.current_folder = folder_path
-                # Update progress more frequently
-                if files_processed % 100 == 0:
-                    logger.debug(f"Progress: {files_processed} files processed, current folder: {folder_path or 'N/A'}")
-                if status.total_sites > 0:
-                    # Rough progress estimate (can be improved)
-                    site_progress = status.sites_processed / status.total_sites
-                    status.progress = min(0.9, site_progress * 0.9)  # Reserve 10% for finalization
-
-            # Get last index time for incremental updates
-            last_index_time = self.index_service._last_indexed
-
-            for idx, site in enumerate(sites):
-                # Check if cancelled
-                if self._cancelled:
-                    logger.info("Indexing cancelled by user - preserving already indexed data")
-                    # Save any sites that were already indexed before cancelling
-                    if site_indexes:
-                        logger.info(f"Saving {len(site_indexes)} sites that were indexed before cancellation")
-                        self.index_service.update_index(site_indexes)
-                    status.status = "cancelled"
-                    status.completed_at = datetime.now()
-                    status.error_message = "Indexing cancelled by user (partial data preserved)"
-                    
-                    # Clear current job ID so get_status returns None for cancelled jobs
-                    if self._current_job_id == job_id:
-                        self._current_job_id = None
-                    
-                    return
+                    current_folder = folder_path
 
-                site_id = site.get("id")
-                site_name = site.get("name", site.get("displayName", "Unknown"))
-                site_url = site.get("webUrl", "")
+            def publish_progress() -> None:
+                """Copy the job's progress counters into its status."""
+                status.files_processed = files_processed
+                if current_folder:
+                    status.current_folder = current_folder
 
-                # Get site configuration (what to index)
-                site_config = self._sites_config.get(site_id, {"index_sharepoint": True, "index_email": True}) if self._sites_config else {"index_sharepoint": True, "index_email": True}
-                index_sharepoint = site_config.get("index_sharepoint", True)
-                index_email = site_config.get("index_email", True)
+            async def progress_publisher() -> None:
+                """Publish progress periodically while the job runs."""
+                while True:
+                    await asyncio.sleep(PROGRESS_PUBLISH_INTERVAL)
+                    publish_progress()
 
-                status.current_site = site_name
+            # Get last index time for incremental updates
+            last_index_time = self.index_service._last_indexed
+            existing_sites = self.index_service.get_sites_by_id()
+
+            # Directory users for site-name matching, fetched at most once per job
+            # (a failed fetch, e.g. a 403, is not retried for every site)
+            user_directory: Optional[_UserDirectory] = None
+            user_directory_error: Optional[Exception] = None
+            user_directory_lock = asyncio.Lock()
+
+            async def get_user_directory() -> _UserDirectory:
+                """Get the job's user directory, loading it on first use."""
+                nonlocal user_directory, user_directory_error
+                async with user_directory_lock:
+                    if user_directory_error is not None:
+                        raise user_directory_error
+                    if user_directory is None:
+                        try:
+                            user_directory = _UserDirectory(await self.email_service.get_all_users())
+                        except Exception as e:
+                            logger.warning(f"Could not load the user directory: {e} - site names won't be matched with users")
+                            user_directory_error = e
+                            raise
+                return user_directory
+
+            def get_site_config(site_id: Optional[str]) -> Mapping[str, bool]:
+                """Get what to index for a site."""
+                return self._sites_config.get(site_id, _DEFAULT_SITE_CONFIG) if self._sites_config else _DEFAULT_SITE_CONFIG
+
+            async def find_site_owner(site: _SiteRef) -> Optional[str]:
+                """Find a site owner's email from site metadata or by matching the site name with users."""
+                # Try to get owner from site metadata first
+                owner_email = await self.sharepoint_service.get_site_owner(site.id, site_data=site.raw, site_name=site.name)
                 
-                # Check if this is an incremental update
-                existing_site_index = self.index_service.get_site_index(site_id)
-                if last_index_time and existing_site_index:
-                    logger.info(f"Incremental update for site {idx + 1}/{len(sites)}: {site_name}")
-                else:
-                    logger.info(f"Full index for site {idx + 1}/{len(sites)}: {site_name}")
+                # If no owner from metadata, try to match site name with user names
+                if not owner_email and site.name:
+                    logger.debug(f"Trying to match site name '{site.name}' with users in directory")
+                    try:
+                        # Match site name against the (once-per-job) user directory
+                        match = (await get_user_directory()).match_site_name(site.name)
+                        if match:
+                            by_display_name, (user_display_name, user_mail, user_upn) = match
+                            if by_display_name:
+                                owner_email = user_mail or user_upn
+                                logger.info(f"Matched site '{site.name}' with user '{user_display_name}' ({owner_email})")
+                            else:
+                                owner_email = user_mail
+                                logger.info(f"Matched site '{site.name}' with user email '{user_mail}'")
+                    except Exception as e:
+                        logger.debug(f"Error matching site name with users: {e}")
+                return owner_email
+
+            async def look_up_site_owners() -> Tuple[Dict[Optional[str], Optional[str]], Dict[str, Optional[Dict[str, Any]]]]:
+                """Find the owners of all sites whose emails are indexed and fetch
+                their user records in batched requests.
+
+                Returns:
+                    Tuple of (site ID -> owner email, owner email -> user metadata or None if not found)
+                """
+                owner_slots = asyncio.Semaphore(OWNER_LOOKUP_CONCURRENCY)
+
+                async def look_up(site: _SiteRef) -> Optional[str]:
+                    """Find one site's owner, or None if the lookup fails."""
+                    async with owner_slots:
+                        try:
+                            return await find_site_owner(site)
+                        except Exception as e:
+                            # Not critical: the site is indexed without its owner's email
+                            logger.warning(f"Could not get site owner for {site.name}: {e} - continuing")
+                            return None
+
+                email_sites = [site for site in site_refs if get_site_config(site.id).get("index_email", True)]
+                owners = await asyncio.gather(*(look_up(site) for site in email_sites))
+                site_owners: Dict[Optional[str], Optional[str]] = {site.id: owner for site, owner in zip(email_sites, owners)}
+                owner_emails = {owner_email for owner_email in site_owners.values() if owner_email}
+                owner_users = await self.email_service.get_users_by_email(owner_emails) if owner_emails else {}
+                return site_owners, owner_users
+
+            # Index sites concurrently (each is I/O-bound on its own Graph endpoints)
+            site_slots = asyncio.Semaphore(max(1, settings.site_indexing_concurrency))
+
+            async def index_one_site(idx: int, site: _SiteRef) -> Optional[SiteIndex]:
+                """Index one site's SharePoint files and owner email attachments.
+
+                Returns:
+                    SiteIndex for the site, or None if it was skipped or failed
+                """
+                nonlocal files_processed, current_folder
+                async with site_slots:
+                    if cancel_event.is_set():
+                        return None
+
+                    site_id = site.id
+                    site_name = site.name
+                    site_url = site.url
+
+                    # Get site configuration (what to index)
+                    site_config = get_site_config(site_id)
+                    index_sharepoint = site_config.get("index_sharepoint", True)
+                    index_email = site_config.get("index_email", True)
+
+                    status.current_site = site_name
+                    
+                    # Check if this is an incremental update
+                    existing_site_index = existing_sites.get(site_id)
+                    if last_index_time and existing_site_index:
+                        logger.info(f"Incremental update for site {idx + 1}/{len(sites)}: {site_name}")
+                    else:
+                        logger.info(f"Full index for site {idx + 1}/{len(sites)}: {site_name}")
 
-                # Create or get existing site index
-                from app.models.index_models import FolderNode, FolderMetadata
-                site_index = existing_site_index
-                if not site_index:
-                    # Create new site index structure
+                    # Collect into a new site index; the one being served is only
+                    # changed when IndexService.update_index merges this run into it
                     site_index = SiteIndex(
                         site_id=site_id,
                         site_name=site_name,
@@ -242,154 +550,176 @@ class BackgroundTaskManager:
                         root_folder=FolderNode(
                             folder=FolderMetadata(id="root", name="Root", child_count=0),
                             files=[],
-                            subfolders={},
                             path="",
                         ),
                         total_files=0,
                         total_folders=0,
                         total_size=0,
-                        last_indexed=datetime.now(),
+                        last_indexed=datetime.now(timezone.utc),
                     )
 
-                try:
-                    # Index SharePoint files if enabled
-                    if index_sharepoint:
-                        logger.info(f"Starting to index SharePoint for site: {site_name} (ID: {site_id})")
-                        # Pass cancellation flag to sharepoint service
-                        self.sharepoint_service._cancelled = self._cancelled
-                        sharepoint_index = await asyncio.wait_for(
-                            self.sharepoint_service.index_site(
-                                site_id,
-                                site_name,
-                                site_url,
-                                progress_callback,
-                                last_index_time,
-                                existing_site_index,
-                            ),
-                            timeout=3600.0,  # 1 hour timeout per site
-                        )
-                        # Merge SharePoint files into site index
-                        site_index.root_folder.files.extend(sharepoint_index.root_folder.files)
-                        site_index.total_files += sharepoint_index.total_files
-                        site_index.total_folders += sharepoint_index.total_folders
-                        site_index.total_size += sharepoint_index.total_size
-                        files_processed += sharepoint_index.total_files
-                        status.files_processed = files_processed
-                        logger.info(f"Successfully indexed SharePoint for site {site_name}: {sharepoint_index.total_files} files, {sharepoint_index.total_folders} folders")
-                    else:
-                        logger.info(f"Skipping SharePoint indexing for site {site_name} (disabled)")
-                    
-                    # Index email attachments if enabled
-                    if index_email:
-                        # Get site owner and index their email attachments
-                        try:
-                            # Try to get owner from site metadata first
-                            owner_email = await self.sharepoint_service.get_site_owner(site_id, site_data=site, site_name=site_name)
-                            
-                            # If no owner from metadata, try to match site name with user names
-                            if not owner_email and site_name:
-                                logger.debug(f"Trying to match site name '{site_name}' with users in directory")
-                                try:
-                                    # Get all users and try to find a match
-                                    all_users = await self.email_service.get_all_users()
-                                    # Try to find user by matching site name (case-insensitive)
-                                    for user in all_users:
-                                        user_display_name = user.get("displayName", "")
-                                        user_mail = user.get("mail", "")
-                                        user_upn = user.get("userPrincipalName", "")
-                                        
-                                        # Check if site name matches user display name
-                                        if user_display_name and site_name.lower() in user_display_name.lower():
-                                            owner_email = user_mail or user_upn
-                                            logger.info(f"Matched site '{site_name}' with user '{user_display_name}' ({owner_email})")
-                                            break
-                                        # Also check if site name matches email username
-                                        if user_mail and site_name.lower().replace(" ", ".") in user_mail.lower():
-                                            owner_email = user_mail
-                                            logger.info(f"Matched site '{site_name}' with user email '{user_mail}'")
-                                            break
-                                except Exception as e:
-                                    logger.debug(f"Error matching site name with users: {e}")
-                            
-                            if owner_email:
-                                logger.info(f"Found owner for site {site_name}: {owner_email} - indexing their email attachments")
-                                status.current_folder = f"Indexing emails for {owner_email}..."
+                    try:
+                        # Index SharePoint files if enabled
+                        if index_sharepoint:
+                            logger.info(f"Starting to index SharePoint for site: {site_name} (ID: {site_id})")
+                            # Files are appended straight into site_index, so a timeout keeps those collected so far
+                            async with asyncio.timeout(3600.0):  # 1 hour timeout per site
+                                sharepoint_files, sharepoint_folders, sharepoint_size = await self.sharepoint_service.index_site(
+                                    site_id,
+                                    site_name,
+                                    site_url,
+                                    site_index,
+                                    progress_callback,
+                                    last_index_time,
+                                    existing_site_index,
+                                    cancel_event,
+                                )
+                            site_index.total_files += sharepoint_files
+                            site_index.total_folders += sharepoint_folders
+                            site_index.total_size += sharepoint_size
+                            files_processed += sharepoint_files
+                            logger.info(f"Successfully indexed SharePoint for site {site_name}: {sharepoint_files} files, {sharepoint_folders} folders")
+                        else:
+                            logger.info(f"Skipping SharePoint indexing for site {site_name} (disabled)")
+                        
+                        # Index email attachments if enabled
+                        if index_email:
+                            # Get site owner and index their email attachments
+                            try:
+                                # Owners of all sites are found and looked up together (shielded, as sites share it)
+                                site_owners, owner_users = await asyncio.shield(owner_lookup)
+                                owner_email = site_owners.get(site_id)
                                 
-                                # Get user info by email
-                                user_info = await self.email_service.get_user_by_email(owner_email)
-                                if user_info:
-                                    user_id = user_info.get("id") or user_info.get("userPrincipalName")
-                                    if user_id:
-                                        # Get email attachments for this site owner
-                                        try:
-                                            attachments = await self.email_service.get_emails_with_attachments(
-                                                user_id,
-                                                owner_email,
-                                                progress_callback,
-                                                self,
-                                                last_index_time,
-                                            )
-                                            
-                                            if len(attachments) > 0:
-                                                logger.info(f"Found {len(attachments)} email attachments for site owner {owner_email}")
-                                                
-                                                # Mark all attachments as from email source
-                                                for attachment in attachments:
-                                                    attachment.source = "email"
+                                if owner_email:
+                                    logger.info(f"Found owner for site {site_name}: {owner_email} - indexing their email attachments")
+                                    current_folder = f"Indexing emails for {owner_email}..."
+                                    
+                                    # Get user info by email (already fetched unless its batched lookup failed)
+                                    if owner_email in owner_users:
+                                        user_info = owner_users[owner_email]
+                                    else:
+                                        user_info = await self.email_service.get_user_by_email(owner_email)
+                                    if user_info:
+                                        user_id = user_info.get("id") or user_info.get("userPrincipalName")
+                                        if user_id:
+                                            # Get email attachments for this site owner
+                                            try:
+                                                attachments = await self.email_service.get_emails_with_attachments(
+                                                    user_id,
+                                                    owner_email,
+                                                    progress_callback,
+                                                    cancel_event,
+                                                    last_index_time,
+                                                )
                                                 
-                                                # Add email attachments to the site's root folder
-                                                site_index.root_folder.files.extend(attachments)
-                                                site_index.total_files += len(attachments)
-                                                files_processed += len(attachments)
-                                                status.files_processed = files_processed
-                                            else:
-                                                logger.debug(f"No email attachments found for site owner {owner_email}")
-                                        except Exception as e:
-                                            error_str = str(e)
-                                            # 404 errors are expected for users without mailboxes - don't log as error
-                                            if "404" not in error_str and "Not Found" not in error_str:
-                                                logger.warning(f"Error indexing emails for site owner {owner_email}: {e}")
+                                                if len(attachments) > 0:
+                                                    logger.info(f"Found {len(attachments)} email attachments for site owner {owner_email}")
+                                                    
+                                                    # Add email attachments (already marked as email source) to the site's root folder
+                                                    site_index.root_folder.files.extend(attachments)
+                                                    site_index.total_files += len(attachments)
+                                                    files_processed += len(attachments)
+                                                else:
+                                                    logger.debug(f"No email attachments found for site owner {owner_email}")
+                                            except Exception as e:
+                                                error_str = str(e)
+                                                # 404 errors are expected for users without mailboxes - don't log as error
+                                                if "404" not in error_str and "Not Found" not in error_str:
+                                                    logger.warning(f"Error indexing emails for site owner {owner_email}: {e}")
+                                        else:
+                                            logger.debug(f"Could not get user ID for site owner {owner_email}")
                                     else:
-                                        logger.debug(f"Could not get user ID for site owner {owner_email}")
+                                        logger.debug(f"Site owner {owner_email} not found in directory")
                                 else:
-                                    logger.debug(f"Site owner {owner_email} not found in directory")
-                            else:
-                                logger.debug(f"No owner found for site {site_name} (tried metadata and name matching)")
-                        except Exception as e:
-                            # Suppress errors for owner lookup - it's not critical
-                            logger.debug(f"Could not get site owner for {site_name}: {e} - continuing")
-                    else:
-                        logger.info(f"Skipping email indexing for site {site_name} (disabled)")
-                    
-                    # Add site index to list
-                    site_indexes.append(site_index)
-                    
-                    # Save progress incrementally (after each site) so it's preserved if cancelled
-                    if site_indexes:
-                        self.index_service.update_index(site_indexes)
-                        logger.debug(f"Incremental save: {len(site_indexes)} sites saved to index")
-                except asyncio.TimeoutError:
-                    logger.error(f"Timeout indexing site {site_name} after 1 hour - skipping")
-                    status.error_message = f"Timeout indexing {site_name}"
-                    # Continue with other sites
-                except Exception as e:
-                    logger.error(f"Error indexing site {site_name}: {e}", exc_info=True)
-                    # Continue with other sites
+                                    logger.debug(f"No owner found for site {site_name} (tried metadata and name matching)")
+                            except Exception as e:
+                                # Suppress errors for owner lookup - it's not critical
+                                logger.warning(f"Could not get site owner for {site_name}: {e} - continuing")
+                        else:
+                            logger.info(f"Skipping email indexing for site {site_name} (disabled)")
+                        
+                        return site_index
+                    except TimeoutError:
+                        status.error_message = f"Timeout indexing {site_name}"
+                        partial_files = len(site_index.root_folder.files)
+                        if partial_files:
+                            # Save what was collected before the timeout (email indexing is skipped)
+                            logger.error(f"Timeout indexing site {site_name} after 1 hour - keeping {partial_files} files collected so far")
+                            site_index.total_files += partial_files
+                            files_processed += partial_files
+                            return site_index
+                        logger.error(f"Timeout indexing site {site_name} after 1 hour - skipping")
+                        # Continue with other sites
+                    except Exception as e:
+                        logger.error(f"Error indexing site {site_name}: {e}", exc_info=True)
+                        # Continue with other sites
 
-                status.sites_processed = idx + 1
-                status.progress = min(0.9, (idx + 1) / len(sites) * 0.9)
+                return None
+
+            async def run_site(idx: int, site: _SiteRef) -> Optional[SiteIndex]:
+                """Run index_one_site, treating a user cancel as a skipped site."""
+                try:
+                    return await index_one_site(idx, site)
+                except asyncio.CancelledError:
+                    if not cancel_event.is_set():
+                        raise
+                    logger.info(f"Stopped indexing site {site.name} (cancelled)")
+                    return None
+
+            # Finished sites are saved by a writer task so merging never blocks the loop
+            save_queue: asyncio.Queue[Optional[List[SiteIndex]]] = asyncio.Queue()
+            writer = asyncio.create_task(self._index_writer(save_queue))
+            publisher = asyncio.create_task(progress_publisher())
+
+            site_refs = [_SiteRef.from_graph(site) for site in sites]
+            owner_lookup = asyncio.create_task(look_up_site_owners())
+            tasks = [asyncio.create_task(run_site(idx, site)) for idx, site in enumerate(site_refs)]
+            self._site_tasks[job_id] = set(tasks)
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    site_index = await finished
+                    status.sites_processed += 1
+                    status.progress = min(0.9, status.sites_processed / len(sites) * 0.9)
+                    if site_index is not None:
+                        site_indexes.append(site_index)
+                        # Save progress incrementally (after each site) so it's preserved if cancelled
+                        save_queue.put_nowait([site_index])
+            finally:
+                publisher.cancel()
+                owner_lookup.cancel()
+                publish_progress()
+                # Only has an effect if this job itself is failing or being cancelled
+                for task in tasks:
+                    task.cancel()
+                # Flush pending saves before the job reports its outcome
+                save_queue.put_nowait(None)
+                await writer
+
+            if cancel_event.is_set():
+                logger.info("Indexing cancelled by user - preserving already indexed data")
+                if site_indexes:
+                    logger.info(f"Kept {len(site_indexes)} sites that were indexed before cancellation")
+                status.status = "cancelled"
+                status.completed_at = datetime.now(timezone.utc)
+                status.error_message = "Indexing cancelled by user (partial data preserved)"
+                
+                # Clear current job ID so get_status returns None for cancelled jobs
+                if self._current_job_id == job_id:
+                    self._current_job_id = None
+                
+                return
 
             # Final update of index (merge with any existing data)
             # This ensures we don't lose data from previous indexing sessions
             # Email attachments are now indexed per site (for each site's owner) in the loop above
             if site_indexes:
                 logger.info("Updating index with all indexed data (SharePoint + Email attachments)...")
-                self.index_service.update_index(site_indexes)
+                await self._update_index(site_indexes)
 
             # Complete
             status.status = "completed"
             status.progress = 1.0
-            status.completed_at = datetime.now()
+            status.completed_at = datetime.now(timezone.utc)
             status.current_site = None
             status.current_folder = None
             
@@ -399,11 +729,14 @@ class BackgroundTaskManager:
             
             logger.info(f"Indexing job {job_id} completed successfully (SharePoint + Email)")
 
+            # Precompute stats etc. for the new index off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.index_service.warm_caches)
+
         except Exception as e:
             logger.error(f"Indexing job {job_id} failed: {e}", exc_info=True)
             status.status = "failed"
             status.error_message = str(e)
-            status.completed_at = datetime.now()
+            status.completed_at = datetime.now(timezone.utc)
             
             # Clear current job ID so get_status returns None for failed jobs
             if self._current_job_id == job_id:
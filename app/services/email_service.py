@@ -1,16 +1,130 @@
 """Email service for Microsoft Graph API integration to fetch email attachments."""
 
 import asyncio
-from typing import List, Optional, Dict, Any, Callable
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Iterable, List, Optional, Dict, Any, Callable, Tuple
 from datetime import datetime
+from urllib.parse import quote
 import httpx
-from msal import ConfidentialClientApplication
+import orjson
 from app.config import settings
+from app.utils.http import HTTP2_AVAILABLE, MAX_THROTTLE_RETRIES, backoff_delay, graph_batch, parse_retry_after
 from app.utils.logger import setup_logger
 from app.models.index_models import FileMetadata
 
 logger = setup_logger(__name__)
 
+# Tokens are replaced this long before they expire, to cover clock skew and in-flight requests
+TOKEN_EXPIRY_SKEW_SECONDS = 60
+
+
+class _TokenBucket:
+    """Client-side token bucket whose rate adapts to throttling.
+
+    The rate is halved whenever Graph throttles a request and creeps back up
+    by one request per second after every run of successful requests, never
+    above the configured rate.
+    """
+
+    def __init__(self, rate: float, capacity: int = 20, min_rate: float = 1.0, successes_per_increase: int = 20):
+        """Initialize the bucket full, sending at the given rate (requests per second)."""
+        self.max_rate = max(rate, min_rate)
+        self.min_rate = min_rate
+        self.rate = self.max_rate
+        self.capacity = capacity
+        self.successes_per_increase = successes_per_increase
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._successes = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def adapt_down(self) -> None:
+        """Halve the rate after being throttled."""
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._successes = 0
+        logger.info(f"Email request rate lowered to {self.rate:.1f}/s")
+
+    def adapt_up(self) -> None:
+        """Count a successful request, raising the rate after a run of them."""
+        if self.rate >= self.max_rate:
+            return
+        self._successes += 1
+        if self._successes >= self.successes_per_increase:
+            self.rate = min(self.max_rate, self.rate + 1)
+            self._successes = 0
+
+
+class _CircuitBreaker:
+    """Fails calls fast while Graph looks unhealthy.
+
+    Trips open when more than half of at least 20 calls in the last minute
+    failed with a server error, timeout or connection error. After 30
+    seconds one probe call is let through; it closes the breaker if it
+    succeeds and keeps it open for another 30 seconds otherwise.
+    """
+
+    def __init__(self, window: float = 60.0, min_calls: int = 20, failure_ratio: float = 0.5, open_seconds: float = 30.0):
+        """Initialize a closed breaker."""
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+        self._results: Deque[Tuple[float, bool]] = deque()  # (time, succeeded)
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        """Check whether a call may be made, letting one probe through once the open period ends."""
+        if self._opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self._opened_at < self.open_seconds:
+            return False
+        # Half-open: this caller probes, everyone else waits out another period
+        self._opened_at = now
+        return True
+
+    def record(self, succeeded: bool) -> None:
+        """Record the outcome of a call."""
+        now = time.monotonic()
+        if self._opened_at is not None:
+            # Result of a half-open probe
+            if succeeded:
+                logger.info("Graph API calls succeeding again - closing circuit breaker")
+                self._opened_at = None
+                self._results.clear()
+                self._failures = 0
+            else:
+                self._opened_at = now
+            return
+
+        self._results.append((now, succeeded))
+        if not succeeded:
+            self._failures += 1
+        while self._results and now - self._results[0][0] > self.window:
+            if not self._results.popleft()[1]:
+                self._failures -= 1
+        if len(self._results) >= self.min_calls and self._failures > self.failure_ratio * len(self._results):
+            logger.error(
+                f"{self._failures}/{len(self._results)} recent Graph API calls failed - "
+                f"failing fast for {self.open_seconds:.0f} seconds"
+            )
+            self._opened_at = now
+
 
 class EmailService:
     """Service for interacting with Outlook/Exchange via Microsoft Graph API to fetch email attachments."""
@@ -20,11 +134,31 @@ class EmailService:
         self.graph_endpoint = "https://graph.microsoft.com/v1.0"
         self.token: Optional[str] = None
         self.token_expires_at: float = 0
-        self._client_app = ConfidentialClientApplication(
-            client_id=settings.azure_client_id,
-            client_credential=settings.azure_client_secret,
-            authority=f"https://login.microsoftonline.com/{settings.azure_tenant_id}",
-        )
+        self._token_endpoint = f"https://login.microsoftonline.com/{settings.azure_tenant_id}/oauth2/v2.0/token"
+        # Only one coroutine refreshes an expired token; the rest wait for it
+        self._token_lock = asyncio.Lock()
+        # Paces every Graph call made by this service
+        self._bucket = _TokenBucket(settings.email_requests_per_second)
+        self._breaker = _CircuitBreaker()
+        # Shared Graph client, created on first use so connections are reused across requests
+        self._http_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Get the shared Microsoft Graph HTTP client."""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=30.0,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            )
+        return self._http_client
+
+    async def aclose(self) -> None:
+        """Close the shared Graph client."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
     
     def clear_token_cache(self):
         """Clear the cached token to force a fresh token acquisition.
@@ -44,16 +178,58 @@ class EmailService:
         Raises:
             Exception: If token acquisition fails
         """
-        import time
-        
-        # Check if token is still valid (with 5 minute buffer)
-        if self.token and time.time() < self.token_expires_at - 300:
+        # Use the token until it (nearly) expires; a 401 also triggers a refresh
+        if self.token and time.time() < self.token_expires_at - TOKEN_EXPIRY_SKEW_SECONDS:
             return self.token
 
+        async with self._token_lock:
+            # Another coroutine may have refreshed it while we waited
+            if self.token and time.time() < self.token_expires_at - TOKEN_EXPIRY_SKEW_SECONDS:
+                return self.token
+            return await self._acquire_token()
+
+    async def _refresh_rejected_token(self, rejected: str) -> str:
+        """Replace a token Graph rejected with 401.
+
+        Args:
+            rejected: The token that was rejected
+
+        Returns:
+            Access token string (someone else's refresh, if one already happened)
+
+        Raises:
+            Exception: If token acquisition fails
+        """
+        async with self._token_lock:
+            if self.token and self.token != rejected:
+                return self.token
+            logger.info("Access token rejected by Graph - refreshing")
+            return await self._acquire_token()
+
+    async def _acquire_token(self) -> str:
+        """Acquire a new access token from Azure AD (caller holds the token lock).
+
+        Returns:
+            Access token string
+
+        Raises:
+            Exception: If token acquisition fails
+        """
         logger.info("Acquiring new access token for email service")
-        result = self._client_app.acquire_token_for_client(
-            scopes=["https://graph.microsoft.com/.default"]
+        # Client credentials grant, posted on the shared client so the loop never blocks
+        response = await self.http_client.post(
+            self._token_endpoint,
+            data={
+                "client_id": settings.azure_client_id,
+                "client_secret": settings.azure_client_secret,
+                "scope": "https://graph.microsoft.com/.default",
+                "grant_type": "client_credentials",
+            },
         )
+        try:
+            result = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            result = {"error": f"HTTP {response.status_code} from token endpoint"}
 
         if "access_token" not in result:
             error = result.get("error_description", result.get("error", "Unknown error"))
@@ -84,7 +260,7 @@ class EmailService:
         Args:
             method: HTTP method (GET, POST, etc.)
             url: Request URL
-            retries: Number of retry attempts
+            retries: Number of attempts for errors and timeouts (429s are retried separately)
             timeout: Request timeout in seconds (default: 30.0)
             **kwargs: Additional arguments for httpx request
 
@@ -92,7 +268,8 @@ class EmailService:
             Response JSON data
 
         Raises:
-            Exception: If request fails after retries
+            Exception: If request fails after retries, or at once while Graph is
+                failing (circuit breaker open)
         """
         token = await self._get_access_token()
         headers = {
@@ -101,68 +278,96 @@ class EmailService:
             **kwargs.pop("headers", {}),
         }
 
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            for attempt in range(retries):
+        client = self.http_client
+        token_refreshed = False
+        attempt = 0
+        throttled = 0
+        while True:
+            # Outside the try so an open breaker is not retried
+            if not self._breaker.allow():
+                raise Exception("Graph API unavailable (circuit breaker open) - failing fast")
+            try:
+                await self._bucket.acquire()
                 try:
-                    try:
-                        response = await asyncio.wait_for(
-                            client.request(method, url, headers=headers, **kwargs),
-                            timeout=timeout
-                        )
-                    except asyncio.TimeoutError:
-                        if attempt < retries - 1:
-                            wait_time = 2 ** attempt
-                            logger.warning(f"Request timeout. Retrying in {wait_time} seconds... (attempt {attempt + 1}/{retries})")
-                            await asyncio.sleep(wait_time)
-                            continue
-                        else:
-                            logger.error(f"Request timeout after {retries} attempts")
-                            raise
-
-                    # Handle rate limiting (429)
-                    if response.status_code == 429:
-                        retry_after = int(response.headers.get("Retry-After", 60))
-                        logger.warning(f"Rate limited. Waiting {retry_after} seconds...")
+                    response = await asyncio.wait_for(
+                        client.request(method, url, headers=headers, timeout=timeout, **kwargs),
+                        timeout=timeout
+                    )
+                except (httpx.TransportError, asyncio.TimeoutError):
+                    self._breaker.record(False)
+                    raise
+
+                # Throttling and client errors still mean Graph is up
+                self._breaker.record(response.status_code < 500)
+
+                # Token expired or revoked early: refresh once and retry
+                if response.status_code == 401 and not token_refreshed:
+                    token_refreshed = True
+                    token = await self._refresh_rejected_token(token)
+                    headers["Authorization"] = f"Bearer {token}"
+                    continue
+
+                # Handle rate limiting (429) without using up an attempt
+                if response.status_code == 429:
+                    self._bucket.adapt_down()
+                    if throttled < MAX_THROTTLE_RETRIES:
+                        # Retry-After is the minimum wait; jitter spreads out the retries
+                        retry_after = max(parse_retry_after(response.headers.get("Retry-After")), backoff_delay(throttled))
+                        throttled += 1
+                        logger.warning(f"Rate limited. Waiting {retry_after:.1f} seconds... ({throttled}/{MAX_THROTTLE_RETRIES})")
                         await asyncio.sleep(retry_after)
                         continue
 
-                    # Handle server errors (503, 502, 500)
-                    if response.status_code in [503, 502, 500]:
-                        wait_time = 2 ** attempt
-                        logger.warning(
-                            f"Server error {response.status_code}. Retrying in {wait_time}s..."
-                        )
-                        await asyncio.sleep(wait_time)
-                        continue
+                response.raise_for_status()
+                self._bucket.adapt_up()
+                return orjson.loads(response.content)
 
-                    response.raise_for_status()
-                    return response.json()
-
-                except httpx.HTTPStatusError as e:
-                    if attempt == retries - 1:
-                        logger.error(f"Request failed after {retries} attempts: {e}")
-                        raise
-                    wait_time = 2 ** attempt
-                    logger.warning(f"HTTP error: {e}. Retrying in {wait_time}s...")
-                    await asyncio.sleep(wait_time)
-
-                except asyncio.TimeoutError:
-                    if attempt == retries - 1:
-                        logger.error(f"Request timeout after {retries} attempts")
-                        raise
-                    wait_time = 2 ** attempt
-                    logger.warning(f"Timeout. Retrying in {wait_time}s...")
-                    await asyncio.sleep(wait_time)
+            except (httpx.HTTPStatusError, asyncio.TimeoutError, httpx.TransportError) as e:
+                attempt += 1
+                if attempt >= retries:
+                    logger.error(f"Request failed after {retries} attempts: {e!r}")
+                    raise
+                wait_time = backoff_delay(attempt - 1)
+                logger.warning(f"Request error: {e!r}. Retrying in {wait_time:.1f}s... (attempt {attempt}/{retries})")
+                await asyncio.sleep(wait_time)
 
-                except Exception as e:
-                    if attempt == retries - 1:
-                        logger.error(f"Request failed: {e}")
-                        raise
-                    wait_time = 2 ** attempt
-                    logger.warning(f"Error: {e}. Retrying in {wait_time}s...")
-                    await asyncio.sleep(wait_time)
+    async def _paginate_iter(
+        self, url: str, params: Optional[Dict] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Paginate through Graph API results, yielding items page by page.
 
-        raise Exception("Request failed after all retries")
+        Args:
+            url: Initial request URL
+            params: Query parameters
+
+        Yields:
+            Items from each page as it arrives
+
+        Raises:
+            Exception: If a page fails before any item was yielded (later
+                failures are logged and end the iteration)
+        """
+        params = dict(params or {})
+        params.setdefault("$top", 999)  # Maximum items per page
+
+        yielded = False
+        while url:
+            try:
+                response = await self._make_request("GET", url, params=params)
+            except Exception as e:
+                # Re-raise if no items were produced yet
+                if not yielded:
+                    raise
+                logger.warning(f"Error paginating request: {e}")
+                return
+
+            for item in response.get("value", []):
+                yielded = True
+                yield item
+
+            # Check for next page
+            url = response.get("@odata.nextLink")
+            params = {}  # Next link already has params
 
     async def _paginate_request(
         self, url: str, params: Optional[Dict] = None
@@ -176,31 +381,28 @@ class EmailService:
         Returns:
             List of all items from all pages
         """
-        all_items = []
-        params = params or {}
-        params["$top"] = 999  # Maximum items per page
+        return [item async for item in self._paginate_iter(url, params)]
 
-        last_error = None
-        while url:
-            try:
-                response = await self._make_request("GET", url, params=params)
-                items = response.get("value", [])
-                all_items.extend(items)
+    async def _graph_batch(self, requests: List[Dict[str, Any]], retries: int = 3) -> Dict[str, Dict[str, Any]]:
+        """Send requests through Graph JSON batching, 20 per call.
 
-                # Check for next page
-                url = response.get("@odata.nextLink")
-                if url:
-                    params = {}  # Next link already has params
-            except Exception as e:
-                last_error = e
-                logger.warning(f"Error paginating request: {e}")
-                break
+        Up to graph_concurrency batch calls are in flight at once. Throttled
+        subrequests (429) are sent again in a later batch after their
+        Retry-After delay.
 
-        # Re-raise the last error if we got one and no items were collected
-        if last_error and len(all_items) == 0:
-            raise last_error
+        Args:
+            requests: Batch subrequests ({"id", "method", "url", ...}), ids unique
+            retries: Number of times a throttled subrequest is attempted
 
-        return all_items
+        Returns:
+            Dict of request id -> subresponse ({"id", "status", "headers", "body"}).
+            Requests in a batch call that failed as a whole are left out.
+        """
+        async def send(chunk: List[Dict[str, Any]]) -> Dict[str, Any]:
+            """POST one batch call."""
+            return await self._make_request("POST", f"{self.graph_endpoint}/$batch", json={"requests": chunk})
+
+        return await graph_batch(requests, send, self._bucket.adapt_down, settings.graph_concurrency, retries)
 
     async def get_all_users(self) -> List[Dict[str, Any]]:
         """Get all users in the organization.
@@ -248,12 +450,42 @@ class EmailService:
             logger.warning(f"Error fetching user {email}: {error_str}")
             return None
 
+    async def get_users_by_email(self, emails: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Get several users by email address using Graph JSON batching.
+
+        Args:
+            emails: User email addresses or UPNs
+
+        Returns:
+            Dict of email -> user metadata, or None if the user was not found.
+            Emails whose lookup failed for another reason are left out.
+        """
+        emails = list(emails)
+        responses = await self._graph_batch([
+            {"id": str(i), "method": "GET", "url": f"/users/{quote(email)}"}
+            for i, email in enumerate(emails)
+        ])
+        users: Dict[str, Optional[Dict[str, Any]]] = {}
+        for i, email in enumerate(emails):
+            response = responses.get(str(i))
+            if response is None:
+                continue
+            if response.get("status") == 200:
+                users[email] = response.get("body", {})
+            elif response.get("status") == 404:
+                logger.debug(f"User {email} not found")
+                users[email] = None
+            else:
+                error = response.get("body", {}).get("error", {}).get("message", "no response")
+                logger.warning(f"Error fetching user {email}: {response.get('status')} {error}")
+        return users
+
     async def get_emails_with_attachments(
         self,
         user_id: str,
         user_email: str,
         progress_callback: Optional[Callable[[], None]] = None,
-        cancelled_flag: Optional[Any] = None,
+        cancel_event: Optional[asyncio.Event] = None,
         last_index_time: Optional[datetime] = None,
     ) -> List[FileMetadata]:
         """Get all emails with attachments for a user.
@@ -262,7 +494,7 @@ class EmailService:
             user_id: User ID or principal name
             user_email: User email address (for display)
             progress_callback: Optional callback for progress updates
-            cancelled_flag: Optional flag object to check for cancellation
+            cancel_event: Optional event that is set when indexing is cancelled
             last_index_time: Optional datetime to only fetch items modified after this time
 
         Returns:
@@ -288,9 +520,11 @@ class EmailService:
             
             logger.info(f"Fetching emails with attachments for user: {user_email}")
             
+            # Stream the messages so attachment batches start while later
+            # pages are still being fetched
+            emails = self._paginate_iter(url, params)
             try:
-                emails = await self._paginate_request(url, params)
-                logger.info(f"Found {len(emails)} emails with attachments for {user_email}")
+                first_email = await anext(emails, None)
             except Exception as api_error:
                 error_str = str(api_error)
                 # 404 means user doesn't have a mailbox (guest user, service account, or mailbox disabled)
@@ -309,100 +543,80 @@ class EmailService:
                     logger.warning(f"Error fetching emails for {user_email}: {error_str} - skipping user")
                     return []
             
-            # Process each email to get attachments
-            for idx, email in enumerate(emails):
+            # Fetch attachments 20 emails at a time using Graph batching,
+            # a few batches at once, and process them in order as they arrive
+            batch_slots = asyncio.Semaphore(max(1, settings.graph_concurrency))
+            # Bound how far paging may run ahead of processing
+            max_pending = 2 * max(1, settings.graph_concurrency)
+
+            async def fetch_chunk(chunk: List[Dict[str, Any]]) -> Optional[Dict[str, Dict[str, Any]]]:
+                """Fetch one chunk's attachments (None if cancelled before it started)."""
+                async with batch_slots:
+                    if cancel_event and cancel_event.is_set():
+                        return None
+                    return await self._graph_batch([
+                        {
+                            "id": str(i),
+                            "method": "GET",
+                            # Only the fields we index; without $select file attachments carry their contentBytes
+                            "url": f"/users/{user_id}/messages/{email['id']}/attachments?$select=id,name,size,contentType",
+                        }
+                        for i, email in enumerate(chunk)
+                    ])
+
+            fetches: Deque[Tuple[List[Dict[str, Any]], asyncio.Task]] = deque()
+            processed = 0
+
+            async def process_next() -> bool:
+                """Process the oldest pending chunk (False if cancelled)."""
+                nonlocal processed
+                chunk, fetch = fetches.popleft()
+                responses = await fetch
                 # Check cancellation
-                if cancelled_flag and hasattr(cancelled_flag, '_cancelled') and cancelled_flag._cancelled:
+                if responses is None or (cancel_event and cancel_event.is_set()):
                     logger.info("Email attachment collection cancelled")
-                    break
-                
-                if progress_callback:
-                    try:
-                        progress_callback()
-                    except TypeError:
-                        pass
+                    return False
+                await self._collect_attachments(
+                    chunk, responses, user_id, progress_callback, all_attachments
+                )
                 
-                email_id = email.get("id")
-                if not email_id:
-                    continue
-                
-                try:
-                    # Get attachments for this email
-                    attachments_url = f"{self.graph_endpoint}/users/{user_id}/messages/{email_id}/attachments"
-                    
-                    # Add timeout for attachment fetching
-                    try:
-                        attachments = await asyncio.wait_for(
-                            self._paginate_request(attachments_url),
-                            timeout=30.0
-                        )
-                    except asyncio.TimeoutError:
-                        logger.warning(f"Timeout fetching attachments for email {email.get('subject', 'Unknown')} - skipping")
-                        continue
-                    except Exception as e:
-                        logger.warning(f"Error fetching attachments for email {email.get('subject', 'Unknown')}: {e} - continuing")
+                # Log progress every 50 emails
+                done = processed + len(chunk)
+                if done // 50 > processed // 50:
+                    logger.info(f"Processed {done} emails for {user_email}, found {len(all_attachments)} attachments so far")
+                processed = done
+                return True
+
+            try:
+                # Messages without an id have no attachments to fetch; skip them
+                # here so each batch subrequest has one
+                chunk = [first_email] if first_email is not None and first_email.get("id") else []
+                async for email in emails:
+                    if not email.get("id"):
                         continue
-                    
-                    # Process each attachment
-                    for attachment in attachments:
-                        try:
-                            attachment_id = attachment.get("id")
-                            attachment_name = attachment.get("name", "Unknown")
-                            attachment_size = attachment.get("size", 0)
-                            
-                            # Get file extension
-                            file_type = ""
-                            if "." in attachment_name:
-                                file_type = attachment_name.split(".")[-1].upper()
-                            
-                            # Get attachment content URL (for viewing/downloading)
-                            # Note: We need to make a separate request to get the content URL
-                            # For now, we'll construct a link to view the email in Outlook
-                            email_web_url = f"https://outlook.office.com/mail/id/{email_id}"
-                            
-                            # Parse dates
-                            received_date = self._parse_datetime(email.get("receivedDateTime"))
-                            last_modified = self._parse_datetime(email.get("lastModifiedDateTime"))
-                            
-                            # Get sender info
-                            from_info = email.get("from", {})
-                            sender_name = from_info.get("emailAddress", {}).get("name", "Unknown")
-                            
-                            # Create FileMetadata for attachment
-                            # Use email_id + attachment_id as unique ID
-                            unique_id = f"email_{user_id}_{email_id}_{attachment_id}"
-                            
-                            attachment_meta = FileMetadata(
-                                id=unique_id,
-                                name=attachment_name,
-                                path=f"Email: {email.get('subject', 'No Subject')}",
-                                file_type=file_type,
-                                web_url=email_web_url,  # Link to email in Outlook
-                                size=attachment_size,
-                                created_date_time=received_date,
-                                last_modified_date_time=last_modified or received_date,
-                                created_by=sender_name,
-                                last_modified_by=sender_name,
-                                mime_type=attachment.get("contentType"),
-                                download_url=None,  # We don't download, just index metadata
-                            )
-                            
-                            all_attachments.append(attachment_meta)
-                            
-                        except Exception as e:
-                            logger.warning(f"Error processing attachment {attachment.get('name', 'Unknown')}: {e} - continuing")
-                            continue
-                    
-                    # Log progress every 50 emails
-                    if (idx + 1) % 50 == 0:
-                        logger.info(f"Processed {idx + 1}/{len(emails)} emails for {user_email}, found {len(all_attachments)} attachments so far")
-                    
-                    # Small delay to prevent API throttling
-                    await asyncio.sleep(0.1)
-                    
-                except Exception as e:
-                    logger.warning(f"Error processing email {email.get('subject', 'Unknown')}: {e} - continuing")
-                    continue
+                    if len(chunk) == 20:
+                        fetches.append((chunk, asyncio.create_task(fetch_chunk(chunk))))
+                        chunk = []
+                        # Process finished chunks, waiting if paging is too far ahead
+                        cancelled = False
+                        while fetches and (fetches[0][1].done() or len(fetches) > max_pending):
+                            if not await process_next():
+                                cancelled = True
+                                break
+                        if cancelled:
+                            break
+                    chunk.append(email)
+                else:
+                    total = processed + sum(len(pending) for pending, _ in fetches) + len(chunk)
+                    logger.info(f"Found {total} emails with attachments for {user_email}")
+                    if chunk:
+                        fetches.append((chunk, asyncio.create_task(fetch_chunk(chunk))))
+                    while fetches and await process_next():
+                        pass
+            finally:
+                await emails.aclose()
+                for _, fetch in fetches:
+                    fetch.cancel()
             
             logger.info(f"Completed email attachment collection for {user_email}: {len(all_attachments)} attachments found")
             
@@ -416,6 +630,94 @@ class EmailService:
         
         return all_attachments
 
+    async def _collect_attachments(
+        self,
+        emails: List[Dict[str, Any]],
+        responses: Dict[str, Dict[str, Any]],
+        user_id: str,
+        progress_callback: Optional[Callable[[], None]],
+        all_attachments: List[FileMetadata],
+    ) -> None:
+        """Turn one batch of attachment listings into FileMetadata.
+
+        Args:
+            emails: Emails in the batch, all with an id (request ids are their positions)
+            responses: Batch subresponses by request id
+            user_id: User ID or principal name the emails belong to
+            progress_callback: Optional callback for progress updates
+            all_attachments: List to append the attachments to
+        """
+        for i, email in enumerate(emails):
+            if progress_callback:
+                try:
+                    progress_callback()
+                except TypeError:
+                    pass
+            
+            email_id = email["id"]
+            response = responses.get(str(i))
+            if response is None or response.get("status") != 200:
+                error = (response or {}).get("body", {}).get("error", {}).get("message", "no response")
+                logger.warning(f"Error fetching attachments for email {email.get('subject', 'Unknown')}: {error} - continuing")
+                continue
+            
+            body = response.get("body", {})
+            attachments = body.get("value", [])
+            next_link = body.get("@odata.nextLink")
+            # Rare: more attachments than fit in one page
+            try:
+                while next_link:
+                    page = await self._make_request("GET", next_link)
+                    attachments.extend(page.get("value", []))
+                    next_link = page.get("@odata.nextLink")
+            except Exception as e:
+                logger.warning(f"Error fetching more attachments for email {email.get('subject', 'Unknown')}: {e} - continuing")
+            
+            # Per-email values shared by all of its attachments
+            # (a link to view the email in Outlook; we don't download content)
+            email_web_url = f"https://outlook.office.com/mail/id/{email_id}"
+            email_path = f"Email: {email.get('subject', 'No Subject')}"
+            received_date = self._parse_datetime(email.get("receivedDateTime"))
+            last_modified = self._parse_datetime(email.get("lastModifiedDateTime")) or received_date
+            sender = (email.get("from") or {}).get("emailAddress") or {}
+            sender_name = sender.get("name", "Unknown")
+
+            # Process each attachment
+            for attachment in attachments:
+                try:
+                    attachment_id = attachment.get("id")
+                    attachment_name = attachment.get("name", "Unknown")
+                    
+                    # Get file extension
+                    file_type = ""
+                    if "." in attachment_name:
+                        file_type = attachment_name.rpartition(".")[2].upper()
+                    
+                    # Create FileMetadata for attachment
+                    # Use email_id + attachment_id as unique ID. Values come straight
+                    # from Graph's schema, so pydantic validation is skipped.
+                    attachment_meta = FileMetadata.model_construct(
+                        id=f"email_{user_id}_{email_id}_{attachment_id}",
+                        name=attachment_name,
+                        path=email_path,
+                        file_type=file_type,
+                        web_url=email_web_url,  # Link to email in Outlook
+                        size=attachment.get("size", 0),
+                        created_date_time=received_date,
+                        last_modified_date_time=last_modified,
+                        created_by=sender_name,
+                        last_modified_by=sender_name,
+                        mime_type=attachment.get("contentType"),
+                        download_url=None,  # We don't download, just index metadata
+                        source="email",
+                    )
+                    
+                    all_attachments.append(attachment_meta)
+                    
+                except Exception as e:
+                    logger.warning(f"Error processing attachment {attachment.get('name', 'Unknown')}: {e} - continuing")
+                    continue
+
     @staticmethod
     def _parse_datetime(dt_str: Optional[str]) -> Optional[datetime]:
         """Parse ISO datetime string.
@@ -429,7 +731,8 @@ class EmailService:
         if not dt_str:
             return None
         try:
-            return datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
-        except Exception:
+            # Python 3.11+ parses the trailing "Z" Graph uses natively
+            return datetime.fromisoformat(dt_str)
+        except (TypeError, ValueError):
             return None
 
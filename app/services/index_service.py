@@ -1,14 +1,48 @@
 """Index service for managing and caching SharePoint index."""
 
-from typing import Dict, Optional, List
-from datetime import datetime
+import threading
+from array import array
+from collections import Counter
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Optional, List, Set, Tuple
+from datetime import datetime, timezone
+import unicodedata
 from cachetools import TTLCache
 from app.config import settings
 from app.utils.logger import setup_logger
-from app.models.index_models import SiteIndex, IndexStats, FileMetadata, FolderNode
+from app.models.index_models import SiteIndex, IndexStats, FileMetadata, FileTable, FolderNode
 
 logger = setup_logger(__name__)
 
+_EMPTY_FILE_TABLE = FileTable.from_files([])
+
+# (file, case-folded NFKC-normalized name)
+SearchEntry = Tuple[FileMetadata, str]
+# A site's search entries in file order, and trigram -> ascending entry positions
+SiteSearchIndex = Tuple[List[SearchEntry], Dict[str, array]]
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Get the distinct 3-character substrings of a string."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _build_search_index(files: Iterable[FileMetadata]) -> SiteSearchIndex:
+    """Build the trigram search index for one site's files."""
+    entries: List[SearchEntry] = []
+    trigrams: Dict[str, array] = {}
+    for file_meta in files:
+        # Normalize file name for comparison (handles Arabic and Unicode)
+        name_folded = unicodedata.normalize('NFKC', file_meta.name).casefold()
+        position = len(entries)
+        entries.append((file_meta, name_folded))
+        for gram in _trigrams(name_folded):
+            postings = trigrams.get(gram)
+            if postings is None:
+                postings = trigrams[gram] = array("I")
+            postings.append(position)
+    return entries, trigrams
+
 
 class IndexService:
     """Service for managing the SharePoint index with caching."""
@@ -20,8 +54,27 @@ class IndexService:
             maxsize=settings.cache_max_size,
             ttl=settings.cache_ttl_seconds,
         )
+        # TTLCache isn't thread-safe and update_index may run in a worker thread
+        self._cache_lock = threading.Lock()
         self._index: Dict[str, SiteIndex] = {}
         self._last_indexed: Optional[datetime] = None
+        # Bumped on every change so callers can cache data derived from the index
+        self._version: int = 0
+        # Per-site file listing columns sorted by lowercase name, rebuilt when a site is updated
+        self._file_tables: Dict[str, FileTable] = {}
+        self._total_files: int = 0
+        self._stats_cache: Optional[Tuple[int, IndexStats]] = None
+        # Per-site trigram search indexes, rebuilt when a site is updated
+        self._search_indexes: Dict[str, SiteSearchIndex] = {}
+        # Per-site file type breakdown for stats, rebuilt when a site is updated
+        self._file_type_counts: Dict[str, Counter] = {}
+        # Per-site file ID -> file, updated in place when a site is merged
+        self._files_by_id: Dict[str, Dict[str, FileMetadata]] = {}
+
+    @property
+    def version(self) -> int:
+        """Monotonic counter identifying the current contents of the index."""
+        return self._version
 
     def update_index(self, site_indexes: List[SiteIndex]) -> None:
         """Update the index with new site indexes.
@@ -33,29 +86,39 @@ class IndexService:
         logger.info(f"Updating index with {len(site_indexes)} sites")
         for site_index in site_indexes:
             # Merge with existing site index if it exists (preserve partial data)
-            existing_site = self._index.get(site_index.site_id)
-            if existing_site and existing_site.root_folder:
-                # Merge files: combine existing and new, avoiding duplicates
-                existing_files = {f.id: f for f in existing_site.root_folder.files}
-                new_files = {f.id: f for f in site_index.root_folder.files}
-                # Update existing files with new data, add new files
-                existing_files.update(new_files)
+            files_by_id = self._files_by_id.get(site_index.site_id)
+            if files_by_id is not None:
+                # Merge files: update existing files with new data, add new files
+                for file_meta in site_index.root_folder.files:
+                    files_by_id[file_meta.id] = file_meta
                 # Create merged root folder
                 merged_root = FolderNode(
                     folder=site_index.root_folder.folder,
-                    files=list(existing_files.values()),
-                    subfolders=site_index.root_folder.subfolders,
+                    files=list(files_by_id.values()),
                     path=site_index.root_folder.path,
                 )
                 # Update totals
                 site_index.root_folder = merged_root
-                site_index.total_files = len(existing_files)
-            
+                site_index.total_files = len(files_by_id)
+                site_index.total_size = sum(f.size or 0 for f in merged_root.files)
+            else:
+                self._files_by_id[site_index.site_id] = {f.id: f for f in site_index.root_folder.files}
+
+            # Derived views first, so readers never see the site without them
+            self._file_tables[site_index.site_id] = FileTable.from_files(site_index.root_folder.files)
+            self._search_indexes[site_index.site_id] = _build_search_index(site_index.root_folder.files)
+            # display_type is the file type, or the name's extension
+            self._file_type_counts[site_index.site_id] = Counter(
+                f.display_type or 'UNKNOWN' for f in site_index.root_folder.files
+            )
             self._index[site_index.site_id] = site_index
             # Also cache it
-            self._cache[site_index.site_id] = site_index
+            with self._cache_lock:
+                self._cache[site_index.site_id] = site_index
 
-        self._last_indexed = datetime.now()
+        self._total_files = sum(len(table) for table in self._file_tables.values())
+        self._last_indexed = datetime.now(timezone.utc)
+        self._version += 1
         logger.info("Index updated successfully (merged with existing data)")
 
     def get_site_index(self, site_id: str) -> Optional[SiteIndex]:
@@ -68,8 +131,10 @@ class IndexService:
             SiteIndex or None if not found
         """
         # Check cache first
-        if site_id in self._cache:
-            return self._cache[site_id]
+        with self._cache_lock:
+            cached = self._cache.get(site_id)
+        if cached is not None:
+            return cached
 
         # Check main index
         return self._index.get(site_id)
@@ -82,42 +147,105 @@ class IndexService:
         """
         return list(self._index.values())
 
+    def get_sites_by_id(self) -> Dict[str, SiteIndex]:
+        """Get a snapshot of all indexed sites keyed by site ID.
+
+        Returns:
+            Dict of site ID -> SiteIndex (a copy, safe to keep while the index changes)
+        """
+        return dict(self._index)
+
+    def get_file_table(self, site_id: str) -> FileTable:
+        """Get a site's file listing columns, sorted by lowercase name.
+
+        Args:
+            site_id: SharePoint site ID
+
+        Returns:
+            FileTable for the site (empty if the site is not indexed)
+        """
+        return self._file_tables.get(site_id, _EMPTY_FILE_TABLE)
+
+    def count_files(self, site_id: Optional[str] = None) -> int:
+        """Count indexed files.
+
+        Args:
+            site_id: Optional site ID to count files for (None = all sites)
+
+        Returns:
+            Number of files
+        """
+        if site_id:
+            return len(self._file_tables.get(site_id, _EMPTY_FILE_TABLE))
+        return self._total_files
+
     def get_stats(self) -> IndexStats:
         """Get statistics about the index.
 
         Returns:
             IndexStats with aggregated statistics including file type breakdown
         """
-        total_sites = len(self._index)
-        total_files = 0
-        total_folders = 0
-        total_size = 0
-        file_types: Dict[str, int] = {}
-
-        for site_index in self._index.values():
-            total_files += site_index.total_files
-            total_folders += site_index.total_folders
-            total_size += site_index.total_size
-            
-            # Count file types
-            for file_meta in site_index.root_folder.files:
-                file_type = getattr(file_meta, 'file_type', '')
-                if not file_type and file_meta.name and '.' in file_meta.name:
-                    file_type = file_meta.name.split('.')[-1].upper()
-                
-                if file_type:
-                    file_types[file_type] = file_types.get(file_type, 0) + 1
-                else:
-                    file_types['UNKNOWN'] = file_types.get('UNKNOWN', 0) + 1
-
-        return IndexStats(
-            total_sites=total_sites,
-            total_files=total_files,
-            total_folders=total_folders,
-            total_size=total_size,
-            file_types=file_types,
+        # Served from cache until the index changes
+        version = self._version
+        if self._stats_cache and self._stats_cache[0] == version:
+            return self._stats_cache[1]
+
+        # Snapshot so this can also run in a worker thread while the index is updated
+        sites = list(self._index.values())
+        # Add up the per-site file type counts kept by update_index
+        file_types: Counter = Counter()
+        for site_index in sites:
+            file_types.update(self._file_type_counts.get(site_index.site_id, ()))
+
+        stats = IndexStats(
+            total_sites=len(sites),
+            total_files=sum(site_index.total_files for site_index in sites),
+            total_folders=sum(site_index.total_folders for site_index in sites),
+            total_size=sum(site_index.total_size for site_index in sites),
+            file_types=dict(file_types),
             last_indexed=self._last_indexed,
         )
+        self._stats_cache = (version, stats)
+        return stats
+
+    def warm_caches(self) -> None:
+        """Precompute data derived from the current index version.
+
+        Meant to run in a worker thread after indexing so the first requests
+        after a refresh don't pay for it on the event loop.
+        """
+        try:
+            self.get_stats()
+        except Exception as e:
+            logger.warning(f"Failed to warm index caches: {e}", exc_info=True)
+
+    def _iter_matches(self, query_folded: str) -> Iterator[Tuple[SiteIndex, FileMetadata, str]]:
+        """Yield (site, file, folded name) for names containing the query, in index order."""
+        # Only names containing every trigram of the query can match. Queries
+        # shorter than a trigram fall back to checking every name.
+        query_grams = _trigrams(query_folded)
+        # Snapshot so the index can be updated in a worker thread meanwhile
+        for site_index in list(self._index.values()):
+            search_index = self._search_indexes.get(site_index.site_id)
+            if search_index is None:
+                continue
+            entries, trigrams = search_index
+            if query_grams:
+                postings = sorted((trigrams.get(gram, ()) for gram in query_grams), key=len)
+                candidates = set(postings[0])
+                for other in postings[1:]:
+                    if not candidates:
+                        break
+                    candidates.intersection_update(other)
+                positions: Iterable[int] = sorted(candidates)
+            else:
+                positions = range(len(entries))
+
+            for position in positions:
+                file_meta, name_folded = entries[position]
+                # Check if query matches (supports Arabic characters)
+                if query_folded in name_folded:
+                    yield site_index, file_meta, name_folded
 
     def search_files(
         self, query: str, limit: Optional[int] = None
@@ -126,57 +254,40 @@ class IndexService:
         Supports Arabic and Unicode characters.
 
         Args:
-            query: Search query (case-insensitive substring match, Unicode-aware)
+            query: Search query (case-insensitive substring match, Unicode-aware; names
+                and query are NFKC-normalized and case-folded)
             limit: Maximum number of results (None = no limit)
 
         Returns:
             List of tuples (SiteIndex, FileMetadata, file_path)
         """
         # Normalize query for better Unicode matching (handles Arabic diacritics)
-        import unicodedata
-        query_normalized = unicodedata.normalize('NFKC', query)
-        query_lower = query_normalized.lower()
-        results = []
-
-        # Simplified search - just search all files in root folder (flat structure)
-        for site_index in self._index.values():
-            for file_meta in site_index.root_folder.files:
-                # Normalize file name for comparison (handles Arabic and Unicode)
-                file_name_normalized = unicodedata.normalize('NFKC', file_meta.name)
-                file_name_lower = file_name_normalized.lower()
-                
-                # Check if query matches (supports Arabic characters)
-                if query_lower in file_name_lower or query_normalized in file_name_normalized:
-                    # Use stored path or construct from name
-                    file_path = file_meta.path if hasattr(file_meta, 'path') and file_meta.path else file_meta.name
-                    results.append((site_index, file_meta, file_path))
-
-                if limit and len(results) >= limit:
-                    break
-            
-            if limit and len(results) >= limit:
-                break
+        query_folded = unicodedata.normalize('NFKC', query).casefold()
+        matches = list(islice(self._iter_matches(query_folded), limit or None))
 
         # Sort by relevance (files with query at start of name first)
         # Use normalized names for sorting to handle Arabic properly
-        results.sort(
-            key=lambda x: (
-                0 if unicodedata.normalize('NFKC', x[1].name).lower().startswith(query_lower) else 1,
-                unicodedata.normalize('NFKC', x[1].name).lower(),
-            )
-        )
-
-        if limit:
-            results = results[:limit]
+        matches.sort(key=lambda entry: (0 if entry[2].startswith(query_folded) else 1, entry[2]))
 
-        return results
+        # Use stored path or construct from name
+        return [
+            (site_index, file_meta, file_meta.path or file_meta.name)
+            for site_index, file_meta, _ in matches
+        ]
 
     def clear_index(self) -> None:
         """Clear the entire index."""
         logger.info("Clearing index")
         self._index.clear()
-        self._cache.clear()
+        with self._cache_lock:
+            self._cache.clear()
+        self._file_tables.clear()
+        self._search_indexes.clear()
+        self._file_type_counts.clear()
+        self._files_by_id.clear()
+        self._total_files = 0
         self._last_indexed = None
+        self._version += 1
 
     def get_index_size(self) -> int:
         """Get the number of sites in the index.
@@ -2,31 +2,179 @@
 
 import asyncio
 import time
-from typing import List, Optional, Dict, Any, Callable
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+from typing import AsyncIterator, Deque, Iterable, List, Optional, Dict, Any, Callable
 from datetime import datetime
 import httpx
+import orjson
 from msal import ConfidentialClientApplication
 from app.config import settings
+from app.utils.http import HTTP2_AVAILABLE, MAX_THROTTLE_RETRIES, backoff_delay, graph_batch, parse_retry_after
 from app.utils.logger import setup_logger
-from app.models.index_models import FileMetadata, FolderMetadata, FolderNode, SiteIndex
+from app.models.index_models import FileMetadata, SiteIndex
 
 logger = setup_logger(__name__)
 
+# Drive item fields read by the flat file walk; without $select Graph returns every facet
+_CHILD_ITEM_FIELDS = "id,name,webUrl,size,createdDateTime,lastModifiedDateTime,createdBy,lastModifiedBy,file,folder"
+# Delta changes also need the parent folder and the deleted/root facets
+_DELTA_ITEM_FIELDS = f"{_CHILD_ITEM_FIELDS},parentReference,deleted,root"
+
+
+def _display_name(identity: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Get the user's display name from a Graph identity set (createdBy, lastModifiedBy)."""
+    # Plain lookups instead of .get(key, {}) chains, which build throwaway dicts per file
+    user = identity.get("user") if identity else None
+    return user.get("displayName") if user else None
+
+
+def _mime_type(item: Dict[str, Any]) -> Optional[str]:
+    """Get the MIME type from a drive item's file facet."""
+    file_facet = item.get("file")
+    return file_facet.get("mimeType") if file_facet else None
+
+
+class _RateLimiter:
+    """Caps requests per sliding time window, waiting only when the window is full."""
+
+    def __init__(self, limit: int, window: float = 1.0):
+        """Initialize the limiter for at most limit requests per window seconds."""
+        self.limit = max(1, limit)
+        self.window = window
+        self._sent: Deque[float] = deque()  # Send times within the current window
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        # Waiters queue on the lock, so slots are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= self.window:
+                    self._sent.popleft()
+                if len(self._sent) < self.limit:
+                    self._sent.append(now)
+                    return
+                await asyncio.sleep(self._sent[0] + self.window - now)
+
+
+class _AdaptiveConcurrency:
+    """Limits requests in flight, adapting the limit to throttling (AIMD).
+
+    The limit is halved when Graph throttles or fails a request (at most once
+    per second, so one burst of errors counts once) and grows by about half a
+    request per limit's worth of successes, between 1 and max_limit.
+    """
+
+    def __init__(self, max_limit: int, increase: float = 0.5, decrease: float = 0.5, cooldown: float = 1.0):
+        """Initialize the limiter starting at max_limit."""
+        self.max_limit = max(1, max_limit)
+        self.limit = float(self.max_limit)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._decreased_at = 0.0
+
+    async def acquire(self) -> None:
+        """Wait for a free slot."""
+        if not self._waiters and self._in_flight < int(self.limit):
+            self._in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Hand back a slot granted just before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Free a slot taken by acquire."""
+        self._in_flight -= 1
+        self._wake()
+
+    def on_success(self) -> None:
+        """Grow the limit after a successful request."""
+        if self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            self._wake()
+
+    def on_throttle(self) -> None:
+        """Shrink the limit after a throttled or failed request."""
+        now = time.monotonic()
+        if now - self._decreased_at < self.cooldown:
+            return
+        self._decreased_at = now
+        self.limit = max(1.0, self.limit * self.decrease)
+        logger.info(f"SharePoint request concurrency lowered to {int(self.limit)}")
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
 
 class SharePointService:
     """Service for interacting with SharePoint via Microsoft Graph API."""
 
+    # App-only tokens don't depend on the instance, so all instances share one
+    # MSAL client and token (created on first use)
+    _client_app: Optional[ConfidentialClientApplication] = None
+    _token: Optional[str] = None
+    _token_expires_at: float = 0
+    # Only one coroutine refreshes an expired token; the rest wait for it.
+    # Created on first use, so it belongs to the event loop that uses it
+    _token_lock: Optional[asyncio.Lock] = None
+
     def __init__(self):
         """Initialize the SharePoint service."""
         self.graph_endpoint = "https://graph.microsoft.com/v1.0"
-        self.token: Optional[str] = None
-        self.token_expires_at: float = 0
-        self._client_app = ConfidentialClientApplication(
-            client_id=settings.azure_client_id,
-            client_credential=settings.azure_client_secret,
-            authority=f"https://login.microsoftonline.com/{settings.azure_tenant_id}",
+        # Shared Graph client, created on first use so connections are reused across requests
+        self._http_client: Optional[httpx.AsyncClient] = None
+        # Paces every Graph call made by this service
+        self._rate_limiter = _RateLimiter(settings.sharepoint_requests_per_second)
+        # At most every site's folder listings in flight, fewer while Graph pushes back
+        self._concurrency = _AdaptiveConcurrency(
+            settings.site_indexing_concurrency * settings.folder_listing_concurrency
         )
 
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Get the shared Microsoft Graph HTTP client."""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=30.0,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            )
+        return self._http_client
+
+    async def aclose(self) -> None:
+        """Close the shared Graph client."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    @classmethod
+    def reset_token_cache(cls) -> None:
+        """Forget the shared token, its lock and the MSAL client.
+
+        The next request acquires a new token, under a lock made in the event
+        loop running at that point.
+        """
+        cls._client_app = None
+        cls._token = None
+        cls._token_expires_at = 0
+        cls._token_lock = None
+
     async def _get_access_token(self) -> str:
         """Get a valid access token, refreshing if necessary.
 
@@ -37,24 +185,55 @@ class SharePointService:
             Exception: If token acquisition fails
         """
         # Check if token is still valid (with 5 minute buffer)
-        if self.token and time.time() < self.token_expires_at - 300:
-            return self.token
+        cls = SharePointService
+        if cls._token and time.time() < cls._token_expires_at - 300:
+            return cls._token
+
+        if cls._token_lock is None:
+            cls._token_lock = asyncio.Lock()
+        async with cls._token_lock:
+            # Another coroutine (or instance) may have refreshed it while we waited
+            if cls._token and time.time() < cls._token_expires_at - 300:
+                return cls._token
+
+            logger.info("Acquiring new access token")
+            # MSAL is synchronous and makes network calls, so keep it off the loop
+            if cls._client_app is None:
+                cls._client_app = await asyncio.to_thread(
+                    ConfidentialClientApplication,
+                    client_id=settings.azure_client_id,
+                    client_credential=settings.azure_client_secret,
+                    authority=f"https://login.microsoftonline.com/{settings.azure_tenant_id}",
+                )
+            result = await asyncio.to_thread(
+                cls._client_app.acquire_token_for_client,
+                scopes=["https://graph.microsoft.com/.default"],
+            )
 
-        logger.info("Acquiring new access token")
-        result = self._client_app.acquire_token_for_client(
-            scopes=["https://graph.microsoft.com/.default"]
-        )
+            if "access_token" not in result:
+                error = result.get("error_description", result.get("error", "Unknown error"))
+                raise Exception(f"Failed to acquire token: {error}")
 
-        if "access_token" not in result:
-            error = result.get("error_description", result.get("error", "Unknown error"))
-            raise Exception(f"Failed to acquire token: {error}")
+            cls._token = result["access_token"]
+            expires_in = result.get("expires_in", 3600)
+            cls._token_expires_at = time.time() + expires_in
 
-        self.token = result["access_token"]
-        expires_in = result.get("expires_in", 3600)
-        self.token_expires_at = time.time() + expires_in
+            logger.info("Access token acquired successfully")
+            return cls._token
 
-        logger.info("Access token acquired successfully")
-        return self.token
+    async def _send(
+        self, client: httpx.AsyncClient, method: str, url: str, headers: Dict[str, str], timeout: float, kwargs: Dict[str, Any]
+    ) -> httpx.Response:
+        """Send one request once it is within the rate and concurrency limits."""
+        await self._rate_limiter.acquire()
+        await self._concurrency.acquire()
+        try:
+            return await asyncio.wait_for(
+                client.request(method, url, headers=headers, timeout=timeout, **kwargs),
+                timeout=timeout
+            )
+        finally:
+            self._concurrency.release()
 
     async def _make_request(
         self,
@@ -69,7 +248,7 @@ class SharePointService:
         Args:
             method: HTTP method (GET, POST, etc.)
             url: Request URL
-            retries: Number of retry attempts
+            retries: Number of attempts for errors and timeouts (429s are retried separately)
             timeout: Request timeout in seconds (default: 30.0)
             **kwargs: Additional arguments for httpx request
 
@@ -86,69 +265,65 @@ class SharePointService:
             **kwargs.pop("headers", {}),
         }
 
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            for attempt in range(retries):
+        client = self.http_client
+        attempt = 0
+        throttled = 0
+        while True:
+            try:
                 try:
-                    # Add timeout wrapper for individual requests
-                    try:
-                        response = await asyncio.wait_for(
-                            client.request(method, url, headers=headers, **kwargs),
-                            timeout=timeout
-                        )
-                    except asyncio.TimeoutError:
-                        if attempt < retries - 1:
-                            wait_time = 2 ** attempt
-                            logger.warning(f"Request timeout. Retrying in {wait_time} seconds... (attempt {attempt + 1}/{retries})")
-                            await asyncio.sleep(wait_time)
-                            continue
-                        else:
-                            logger.error(f"Request timeout after {retries} attempts")
-                            raise
-
-                    # Handle rate limiting (429)
-                    if response.status_code == 429:
-                        retry_after = int(response.headers.get("Retry-After", 60))
-                        logger.warning(f"Rate limited. Waiting {retry_after} seconds...")
-                        await asyncio.sleep(retry_after)
-                        continue
+                    response = await self._send(client, method, url, headers, timeout, kwargs)
+                except asyncio.TimeoutError:
+                    self._concurrency.on_throttle()
+                    raise
+
+                if response.status_code == 429 or response.status_code >= 500:
+                    self._concurrency.on_throttle()
+                elif response.status_code < 400:
+                    self._concurrency.on_success()
+
+                # Handle rate limiting (429) without using up an attempt
+                if response.status_code == 429 and throttled < MAX_THROTTLE_RETRIES:
+                    throttled += 1
+                    # Wait exactly as long as Graph asks
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    logger.warning(f"Rate limited. Waiting {retry_after:.1f} seconds... ({throttled}/{MAX_THROTTLE_RETRIES})")
+                    await asyncio.sleep(retry_after)
+                    continue
 
-                    # Handle server errors (503, 502, 500)
-                    if response.status_code in [503, 502, 500]:
-                        wait_time = 2 ** attempt
-                        logger.warning(
-                            f"Server error {response.status_code}. Retrying in {wait_time}s..."
-                        )
-                        await asyncio.sleep(wait_time)
-                        continue
+                response.raise_for_status()
+                return orjson.loads(response.content)
 
-                    response.raise_for_status()
-                    return response.json()
+            except (httpx.HTTPStatusError, asyncio.TimeoutError, httpx.TransportError) as e:
+                attempt += 1
+                if attempt >= retries:
+                    logger.error(f"Request failed after {retries} attempts: {e!r}")
+                    raise
+                wait_time = backoff_delay(attempt - 1)
+                logger.warning(f"Request error: {e!r}. Retrying in {wait_time:.1f}s... (attempt {attempt}/{retries})")
+                await asyncio.sleep(wait_time)
 
-                except httpx.HTTPStatusError as e:
-                    if attempt == retries - 1:
-                        logger.error(f"Request failed after {retries} attempts: {e}")
-                        raise
-                    wait_time = 2 ** attempt
-                    logger.warning(f"HTTP error: {e}. Retrying in {wait_time}s...")
-                    await asyncio.sleep(wait_time)
+    async def _paginate_pages(
+        self, url: str, params: Optional[Dict] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Paginate through Graph API results, yielding each page as it arrives.
 
-                except asyncio.TimeoutError:
-                    if attempt == retries - 1:
-                        logger.error(f"Request timeout after {retries} attempts")
-                        raise
-                    wait_time = 2 ** attempt
-                    logger.warning(f"Timeout. Retrying in {wait_time}s...")
-                    await asyncio.sleep(wait_time)
-
-                except Exception as e:
-                    if attempt == retries - 1:
-                        logger.error(f"Request failed: {e}")
-                        raise
-                    wait_time = 2 ** attempt
-                    logger.warning(f"Error: {e}. Retrying in {wait_time}s...")
-                    await asyncio.sleep(wait_time)
-
-        raise Exception("Request failed after all retries")
+        Args:
+            url: Initial request URL
+            params: Query parameters
+
+        Yields:
+            Response body of each page (items in "value")
+
+        Raises:
+            Exception: If a page request fails
+        """
+        while url:
+            response = await self._make_request("GET", url, params=params)
+            yield response
+
+            # Check for next page
+            url = response.get("@odata.nextLink")
+            params = None  # Next link already has params
 
     async def _paginate_request(
         self, url: str, params: Optional[Dict] = None
@@ -162,21 +337,30 @@ class SharePointService:
         Returns:
             List of all items from all pages
         """
-        all_items = []
         params = params or {}
         params["$top"] = 999  # Maximum items per page
+        return [item async for page in self._paginate_pages(url, params) for item in page.get("value", [])]
 
-        while url:
-            response = await self._make_request("GET", url, params=params)
-            items = response.get("value", [])
-            all_items.extend(items)
+    async def _graph_batch(self, requests: List[Dict[str, Any]], retries: int = 3) -> Dict[str, Dict[str, Any]]:
+        """Send requests through Graph JSON batching, 20 per call.
 
-            # Check for next page
-            url = response.get("@odata.nextLink")
-            if url:
-                params = {}  # Next link already has params
+        Up to folder_listing_concurrency batch calls are in flight at once.
+        Throttled subrequests (429) are sent again in a later batch after
+        their Retry-After delay.
 
-        return all_items
+        Args:
+            requests: Batch subrequests ({"id", "method", "url", ...}), ids unique
+            retries: Number of times a throttled subrequest is attempted
+
+        Returns:
+            Dict of request id -> subresponse ({"id", "status", "headers", "body"}).
+            Requests in a batch call that failed as a whole are left out.
+        """
+        async def send(chunk: List[Dict[str, Any]]) -> Dict[str, Any]:
+            """POST one batch call."""
+            return await self._make_request("POST", f"{self.graph_endpoint}/$batch", json={"requests": chunk})
+
+        return await graph_batch(requests, send, self._concurrency.on_throttle, settings.folder_listing_concurrency, retries)
 
     async def get_all_sites(self) -> List[Dict[str, Any]]:
         """Get all SharePoint sites accessible to the app.
@@ -189,15 +373,7 @@ class SharePointService:
         # If specific site IDs are provided, use them
         if settings.sharepoint_site_ids:
             site_ids = [s.strip() for s in settings.sharepoint_site_ids.split(",") if s.strip()]
-            sites = []
-            for site_id in site_ids:
-                try:
-                    url = f"{self.graph_endpoint}/sites/{site_id}"
-                    site = await self._make_request("GET", url)
-                    sites.append(site)
-                except Exception as e:
-                    logger.warning(f"Failed to fetch site {site_id}: {e}")
-            return sites
+            return await self.get_sites_by_ids(site_ids)
 
         # Otherwise, discover all sites
         url = f"{self.graph_endpoint}/sites"
@@ -205,6 +381,31 @@ class SharePointService:
         logger.info(f"Found {len(sites)} SharePoint sites")
         return sites
     
+    async def get_sites_by_ids(self, site_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """Get metadata for specific sites using Graph JSON batching.
+
+        Args:
+            site_ids: SharePoint site IDs
+
+        Returns:
+            List of site metadata (sites that could not be fetched are skipped)
+        """
+        site_ids = list(site_ids)
+        # Batch calls (20 sites each) go out concurrently; throttled sites are retried
+        responses = await self._graph_batch([
+            {"id": str(i), "method": "GET", "url": f"/sites/{site_id}"}
+            for i, site_id in enumerate(site_ids)
+        ])
+        sites = []
+        for i, site_id in enumerate(site_ids):
+            response = responses.get(str(i), {})
+            if response.get("status") == 200:
+                sites.append(response.get("body", {}))
+            else:
+                error = (response.get("body") or {}).get("error", {}).get("message", "no response")
+                logger.warning(f"Failed to fetch site {site_id}: {response.get('status')} {error}")
+        return sites
+
     async def get_site_owner(self, site_id: str, site_data: Optional[Dict[str, Any]] = None, site_name: Optional[str] = None) -> Optional[str]:
         """Get the owner email address for a SharePoint site.
 
@@ -254,58 +455,91 @@ class SharePointService:
         return libraries
 
     async def get_all_files_flat(
-        self, drive_id: str, progress_callback: Optional[Callable[[], None]] = None, cancelled_flag: Optional[Any] = None,
-        last_index_time: Optional[datetime] = None, existing_files_map: Optional[Dict[str, FileMetadata]] = None
+        self, drive_id: str, progress_callback: Optional[Callable[[], None]] = None, cancel_event: Optional[asyncio.Event] = None,
+        last_index_time: Optional[datetime] = None, existing_files_map: Optional[Dict[str, FileMetadata]] = None,
+        all_files: Optional[List[FileMetadata]] = None, folder_paths: Optional[Dict[str, str]] = None
     ) -> List[FileMetadata]:
         """Get all files from a drive as a flat list (simpler and faster).
 
         Args:
             drive_id: SharePoint drive (library) ID
             progress_callback: Optional callback for progress updates
-            cancelled_flag: Optional flag object to check for cancellation
+            cancel_event: Optional event that is set when indexing is cancelled
             last_index_time: Optional datetime to only fetch items modified after this time
             existing_files_map: Optional dict of existing files by ID for incremental updates
+            all_files: Optional list to append the files to (a new list by default)
+            folder_paths: Optional dict to record folder ID -> path in for every folder
+                found; cleared if the walk is cancelled or a folder can't be listed
 
         Returns:
-            List of FileMetadata objects
+            List of FileMetadata objects (all_files, if given)
         """
-        all_files = []
+        if all_files is None:
+            all_files = []
+        first_file = len(all_files)
         folders_to_process = [("root", "")]
         existing_files_map = existing_files_map or {}
         skipped_count = 0
+        complete = True
         
+        async def list_folders(wave: List[tuple[str, str]]) -> List[Optional[List[Dict[str, Any]]]]:
+            """Fetch the children of a wave of folders (None for folders that failed)."""
+            listings: List[Optional[List[Dict[str, Any]]]] = [[] for _ in wave]
+            pending = {
+                str(i): f"/drives/{drive_id}/items/{folder_id}/children?$top=999&$select={_CHILD_ITEM_FIELDS}"
+                for i, (folder_id, _) in enumerate(wave)
+            }
+            # Folders with more pages go round again with their next links
+            while pending:
+                if cancel_event and cancel_event.is_set():
+                    for request_id in pending:
+                        listings[int(request_id)] = None
+                    break
+                responses = await self._graph_batch([
+                    {"id": request_id, "method": "GET", "url": url} for request_id, url in pending.items()
+                ])
+                next_pending = {}
+                for request_id in pending:
+                    i = int(request_id)
+                    response = responses.get(request_id)
+                    if response is None or response.get("status") != 200:
+                        error = ((response or {}).get("body") or {}).get("error", {}).get("message", "no response")
+                        logger.warning(f"Error fetching folder {wave[i][1]}: {error} - continuing")
+                        listings[i] = None
+                        continue
+                    body = response.get("body") or {}
+                    listings[i].extend(body.get("value", []))
+                    next_link = body.get("@odata.nextLink")
+                    if next_link:
+                        next_pending[request_id] = next_link.removeprefix(self.graph_endpoint)
+                pending = next_pending
+            return listings
+
         logger.info(f"Starting flat file collection for drive {drive_id}")
         
+        # Folders are listed a wave at a time through Graph batching and
+        # processed in queue order, so files come out in the same order as a
+        # sequential walk
         while folders_to_process:
-            # Check cancellation if flag provided
-            if cancelled_flag and hasattr(cancelled_flag, '_cancelled') and cancelled_flag._cancelled:
+            if cancel_event and cancel_event.is_set():
                 logger.info("File collection cancelled")
+                complete = False
                 break
-                
-            folder_id, folder_path = folders_to_process.pop(0)
-            
-            try:
-                if progress_callback:
+
+            wave = folders_to_process
+            folders_to_process = []
+            if progress_callback:
+                for _, folder_path in wave:
                     try:
                         progress_callback(folder_path)
                     except TypeError:
                         progress_callback()
-                
-                url = f"{self.graph_endpoint}/drives/{drive_id}/items/{folder_id}/children"
-                
-                # Add timeout for folder content fetching
-                try:
-                    items = await asyncio.wait_for(
-                        self._paginate_request(url),
-                        timeout=120.0  # 2 minutes max per folder
-                    )
-                except asyncio.TimeoutError:
-                    logger.warning(f"Timeout fetching folder {folder_path} - skipping")
-                    continue
-                except Exception as e:
-                    logger.warning(f"Error fetching folder {folder_path}: {e} - continuing")
+            listings = await list_folders(wave)
+
+            for (_, folder_path), items in zip(wave, listings):
+                if items is None:
+                    complete = False
                     continue
-                
                 # Process files - fetch name, webUrl, type, dates, and owner
                 for item in items:
                     if "file" in item:
@@ -331,29 +565,9 @@ class SharePointService:
                                         skipped_count += 1
                                         continue
                             
-                            # Get file extension for type
-                            file_type = ""
-                            if "." in file_name:
-                                file_type = file_name.split(".")[-1].upper()
-                            
                             # Process file metadata with timeout protection
                             try:
-                                file_meta = FileMetadata(
-                                    id=file_id,
-                                    name=file_name,
-                                    web_url=item.get("webUrl"),
-                                    size=None,  # Not needed for table
-                                    created_date_time=self._parse_datetime(item.get("createdDateTime")),
-                                    last_modified_date_time=file_modified,
-                                    created_by=item.get("createdBy", {}).get("user", {}).get("displayName"),
-                                    last_modified_by=item.get("lastModifiedBy", {}).get("user", {}).get("displayName"),
-                                    mime_type=item.get("file", {}).get("mimeType"),
-                                    download_url=None,
-                                )
-                                # Store path and type with file
-                                file_meta.path = folder_path
-                                file_meta.file_type = file_type
-                                all_files.append(file_meta)
+                                all_files.append(self._file_metadata(item, folder_path, file_modified))
                                 
                                 if progress_callback:
                                     try:
@@ -376,266 +590,183 @@ class SharePointService:
                         folder_name = item.get("name", "Unknown")
                         new_path = f"{folder_path}/{folder_name}" if folder_path else folder_name
                         folders_to_process.append((item.get("id"), new_path))
-                
-                # Log progress every 100 files
-                if len(all_files) % 100 == 0 and len(all_files) > 0:
-                    logger.info(f"Collected {len(all_files)} files so far, {len(folders_to_process)} folders remaining")
-                
-                # Add small delay to prevent overwhelming the API
-                await asyncio.sleep(0.1)
-                    
-            except asyncio.TimeoutError:
-                logger.warning(f"Timeout processing folder {folder_path} - skipping")
-                continue
-            except Exception as e:
-                logger.warning(f"Error processing folder {folder_path}: {e} - continuing with next folder")
-                continue
+                        if folder_paths is not None:
+                            folder_paths[item.get("id")] = new_path
+
+            # Log progress after each wave
+            collected = len(all_files) - first_file
+            if collected > 0:
+                logger.info(f"Collected {collected} files so far, {len(folders_to_process)} folders remaining")
         
         if skipped_count > 0:
-            logger.info(f"Completed flat file collection: {len(all_files)} files found ({skipped_count} skipped - already indexed)")
+            logger.info(f"Completed flat file collection: {len(all_files) - first_file} files found ({skipped_count} skipped - already indexed)")
         else:
-            logger.info(f"Completed flat file collection: {len(all_files)} files found")
+            logger.info(f"Completed flat file collection: {len(all_files) - first_file} files found")
+        if not complete and folder_paths is not None:
+            folder_paths.clear()
         return all_files
 
-    async def get_folder_contents(
-        self, drive_id: str, folder_id: str = "root"
-    ) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-        """Get files and subfolders in a folder.
+    def _file_metadata(self, item: Dict[str, Any], folder_path: str, file_modified: Optional[datetime]) -> FileMetadata:
+        """Build file metadata from a drive item.
 
         Args:
-            drive_id: SharePoint drive (library) ID
-            folder_id: Folder ID (default: "root")
+            item: Drive item with a file facet
+            folder_path: Path of the folder holding the file
+            file_modified: Parsed lastModifiedDateTime of the item
 
         Returns:
-            Tuple of (files, folders) lists
+            FileMetadata for the file
         """
-        url = f"{self.graph_endpoint}/drives/{drive_id}/items/{folder_id}/children"
-        items = await self._paginate_request(url)
+        file_name = item.get("name", "Unknown")
+        # Get file extension for type
+        file_type = ""
+        if "." in file_name:
+            file_type = file_name.rpartition(".")[2].upper()
+
+        # Values come straight from Graph's schema, so pydantic validation is skipped
+        return FileMetadata.model_construct(
+            id=item.get("id"),
+            name=file_name,
+            path=folder_path,
+            file_type=file_type,
+            web_url=item.get("webUrl"),
+            size=None,  # Not needed for table
+            created_date_time=self._parse_datetime(item.get("createdDateTime")),
+            last_modified_date_time=file_modified,
+            created_by=_display_name(item.get("createdBy")),
+            last_modified_by=_display_name(item.get("lastModifiedBy")),
+            mime_type=_mime_type(item),
+            download_url=None,
+        )
 
-        files = [item for item in items if "file" in item]
-        folders = [item for item in items if "folder" in item]
+    async def get_delta_changes(
+        self, drive_id: str, delta_link: Optional[str] = None, latest: bool = False
+    ) -> tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get the drive items changed since a delta link.
 
-        return files, folders
+        Args:
+            drive_id: SharePoint drive (library) ID
+            delta_link: Delta link from a previous call (None = start from scratch)
+            latest: Skip the existing items and only get a delta link for the drive's current state
 
-    async def build_folder_tree(
-        self,
-        drive_id: str,
-        folder_id: str = "root",
-        path: str = "",
+        Returns:
+            Tuple of (changed drive items, delta link for the next call)
+        """
+        if delta_link:
+            url, params = delta_link, None
+        else:
+            url = f"{self.graph_endpoint}/drives/{drive_id}/root/delta"
+            params = {"$select": _DELTA_ITEM_FIELDS, "$top": 999}
+            if latest:
+                params["token"] = "latest"
+
+        items: List[Dict[str, Any]] = []
+        next_delta_link = None
+        async for page in self._paginate_pages(url, params):
+            items.extend(page.get("value", []))
+            # Only the last page has the delta link (which already has params)
+            next_delta_link = page.get("@odata.deltaLink")
+        return items, next_delta_link
+
+    async def _collect_delta_files(
+        self, drive_id: str, delta_link: str, folder_paths: Dict[str, str], all_files: List[FileMetadata],
         progress_callback: Optional[Callable[[], None]] = None,
-        last_index_time: Optional[datetime] = None,
-        existing_node: Optional[FolderNode] = None,
-        max_depth: int = 50,
-        current_depth: int = 0,
-    ) -> FolderNode:
-        """Recursively build folder tree structure.
+    ) -> Optional[str]:
+        """Append the files changed since a delta link to a list.
 
         Args:
-            drive_id: SharePoint drive ID
-            folder_id: Current folder ID
-            path: Current folder path
+            drive_id: SharePoint drive (library) ID
+            delta_link: Delta link from the previous run
+            folder_paths: Folder ID -> path from the previous run, updated with new folders
+            all_files: List to append the changed files to
             progress_callback: Optional callback for progress updates
-            last_index_time: Optional datetime to only fetch items modified after this time
-            existing_node: Optional existing FolderNode to merge updates into
-            max_depth: Maximum recursion depth to prevent infinite loops
-            current_depth: Current recursion depth
 
         Returns:
-            FolderNode with complete tree structure
-        """
-        # Prevent infinite recursion
-        if current_depth >= max_depth:
-            logger.warning(f"Max depth {max_depth} reached at path: {path}")
-            folder_meta = FolderMetadata(
-                id=folder_id,
-                name=path.split("/")[-1] if path else "root",
-            )
-            return FolderNode(folder=folder_meta, path=path)
-
-        try:
-            logger.debug(f"Fetching folder contents: {path} (depth: {current_depth})")
-            files, folders = await self.get_folder_contents(drive_id, folder_id)
-            logger.debug(f"Found {len(files)} files and {len(folders)} folders in {path}")
-        except Exception as e:
-            logger.error(f"Error fetching folder {folder_id}: {e}")
-            # Return empty folder node on error
-            folder_meta = FolderMetadata(
-                id=folder_id,
-                name=path.split("/")[-1] if path else "root",
-            )
-            return FolderNode(folder=folder_meta, path=path)
-
-        # Get folder metadata
-        try:
-            url = f"{self.graph_endpoint}/drives/{drive_id}/items/{folder_id}"
-            folder_data = await self._make_request("GET", url)
-        except Exception as e:
-            logger.warning(f"Could not fetch folder metadata for {folder_id}: {e}")
-            folder_data = {"name": path.split("/")[-1] if path else "root"}
-
-        folder_meta = FolderMetadata(
-            id=folder_id,
-            name=folder_data.get("name", "Unknown"),
-            web_url=folder_data.get("webUrl"),
-            created_date_time=self._parse_datetime(folder_data.get("createdDateTime")),
-            last_modified_date_time=self._parse_datetime(
-                folder_data.get("lastModifiedDateTime")
-            ),
-            child_count=len(files) + len(folders),
-        )
-
-        # Process files - incremental update if last_index_time provided
-        file_metadata_list = []
-        existing_files_map = {}
-        if existing_node:
-            existing_files_map = {f.id: f for f in existing_node.files}
-
-        for file_data in files:
-            try:
-                file_id = file_data.get("id")
-                file_modified = self._parse_datetime(file_data.get("lastModifiedDateTime"))
-                
-                # Skip if incremental update and file hasn't changed
-                if last_index_time and file_id in existing_files_map:
-                    existing_file = existing_files_map[file_id]
-                    if existing_file.last_modified_date_time and file_modified:
-                        if file_modified <= existing_file.last_modified_date_time:
-                            # File hasn't changed, keep existing
-                            file_metadata_list.append(existing_file)
-                            continue
-
-                file_meta = FileMetadata(
-                    id=file_id,
-                    name=file_data.get("name", "Unknown"),
-                    web_url=file_data.get("webUrl"),
-                    size=file_data.get("size"),
-                    created_date_time=self._parse_datetime(file_data.get("createdDateTime")),
-                    last_modified_date_time=file_modified,
-                    created_by=file_data.get("createdBy", {}).get("user", {}).get("displayName"),
-                    last_modified_by=file_data.get(
-                        "lastModifiedBy", {}
-                    ).get("user", {}).get("displayName"),
-                    mime_type=file_data.get("file", {}).get("mimeType"),
-                    download_url=file_data.get("@microsoft.graph.downloadUrl"),
-                )
-                file_metadata_list.append(file_meta)
-            except Exception as e:
-                logger.warning(f"Error processing file {file_data.get('name')}: {e}")
+            Delta link for the next run
 
-        # Process subfolders recursively - incremental update if last_index_time provided
-        subfolders = {}
-        existing_subfolders = existing_node.subfolders if existing_node else {}
-        
-        # Limit number of folders processed to prevent hanging on sites with thousands of folders
-        max_folders_per_level = 1000
-        folders_to_process = folders[:max_folders_per_level]
-        if len(folders) > max_folders_per_level:
-            logger.warning(f"Limiting folder processing to {max_folders_per_level} folders at {path} (found {len(folders)})")
-        
-        for idx, folder_data in enumerate(folders_to_process):
-            folder_name = folder_data.get("name", "Unknown")
-            new_path = f"{path}/{folder_name}" if path else folder_name
-            folder_modified = self._parse_datetime(folder_data.get("lastModifiedDateTime"))
+        Raises:
+            Exception: If a change can't be placed in the known folders (a full walk is needed)
+        """
+        # Changes are processed a page at a time rather than held until the last page
+        next_delta_link = None
+        change_count = 0
+        changed_files: List[FileMetadata] = []
+        async for page in self._paginate_pages(delta_link):
+            next_delta_link = page.get("@odata.deltaLink")
+            items = page.get("value", [])
+            change_count += len(items)
+            for item in items:
+                item_id = item.get("id")
+                # Deleted items stay indexed, as with a full walk
+                if "deleted" in item:
+                    continue
+                if "root" in item:
+                    folder_paths[item_id] = ""
+                    continue
 
-            # Update progress more frequently
-            if progress_callback:
-                try:
-                    # Try to call with folder path if callback supports it
-                    progress_callback(new_path)
-                except TypeError:
-                    # Fallback for callbacks that don't accept arguments
-                    progress_callback()
-            
-            # Log progress every 50 folders
-            if idx % 50 == 0 and idx > 0:
-                logger.info(f"Processing folder {idx}/{len(folders_to_process)} in {path}")
+                parent_path = folder_paths.get((item.get("parentReference") or {}).get("id"))
+                if parent_path is None:
+                    raise Exception(f"Delta change {item.get('name')} is in an unknown folder")
+                name = item.get("name", "Unknown")
+                path = f"{parent_path}/{name}" if parent_path else name
+
+                if "folder" in item:
+                    # Delta doesn't resend the contents of a renamed or moved folder
+                    known_path = folder_paths.get(item_id)
+                    if known_path is not None and known_path != path:
+                        raise Exception(f"Folder {known_path} was renamed or moved")
+                    folder_paths[item_id] = path
+                elif "file" in item:
+                    changed_files.append(
+                        self._file_metadata(item, parent_path, self._parse_datetime(item.get("lastModifiedDateTime")))
+                    )
+                    if progress_callback:
+                        try:
+                            progress_callback(parent_path)
+                        except TypeError:
+                            progress_callback()
 
-            try:
-                # Check if we need to process this folder (incremental update)
-                existing_subfolder = existing_subfolders.get(folder_name)
-                if last_index_time and existing_subfolder:
-                    # Check if folder or its contents have changed
-                    folder_id_val = folder_data.get("id")
-                    if folder_modified and existing_subfolder.folder.last_modified_date_time:
-                        if folder_modified <= existing_subfolder.folder.last_modified_date_time:
-                            # Folder hasn't changed, keep existing but check children
-                            # Still need to check for new files/folders
-                            pass
-
-                subfolder_node = await self.build_folder_tree(
-                    drive_id,
-                    folder_data.get("id"),
-                    new_path,
-                    progress_callback,
-                    last_index_time,
-                    existing_subfolder,
-                    max_depth,
-                    current_depth + 1,
-                )
-                subfolders[folder_name] = subfolder_node
-            except asyncio.TimeoutError:
-                logger.error(f"Timeout processing subfolder {folder_name} at {new_path}")
-                # Continue with next folder
-            except Exception as e:
-                logger.warning(f"Error processing subfolder {folder_name} at {new_path}: {e}", exc_info=True)
-                # Continue with next folder instead of failing completely
-        
-        # Keep existing subfolders that weren't found (they might have been deleted, but we keep them for now)
-        if existing_node and not last_index_time:
-            # Full refresh - don't keep old folders
-            pass
-        elif existing_node:
-            # Incremental - keep folders that still exist but weren't in this batch
-            for folder_name, existing_subfolder in existing_subfolders.items():
-                if folder_name not in subfolders:
-                    subfolders[folder_name] = existing_subfolder
-
-        return FolderNode(
-            folder=folder_meta,
-            files=file_metadata_list,
-            subfolders=subfolders,
-            path=path,
-        )
+        all_files.extend(changed_files)
+        logger.info(f"Collected {len(changed_files)} changed files from {change_count} delta changes for drive {drive_id}")
+        return next_delta_link
 
     async def index_site(
         self,
         site_id: str,
         site_name: str,
         site_url: str,
+        target: SiteIndex,
         progress_callback: Optional[Callable[[], None]] = None,
         last_index_time: Optional[datetime] = None,
         existing_index: Optional[SiteIndex] = None,
-    ) -> SiteIndex:
-        """Index all content in a SharePoint site.
+        cancel_event: Optional[asyncio.Event] = None,
+    ) -> tuple[int, int, int]:
+        """Index all content in a SharePoint site into a site index.
+
+        Files are appended to target's root folder as they are collected;
+        the caller adds the returned counts to the target's totals. target
+        should be a fresh SiteIndex for this run: existing_index is only read,
+        so the live index is never changed while files are collected.
 
         Args:
             site_id: SharePoint site ID
             site_name: Site name
             site_url: Site URL
+            target: SiteIndex for this run to append the site's files to
             progress_callback: Optional callback for progress updates
             last_index_time: Optional datetime to only fetch items modified after this time
-            existing_index: Optional existing SiteIndex to merge updates into
+            existing_index: Optional existing SiteIndex the updates will be merged into
+            cancel_event: Optional event that is set when indexing is cancelled
 
         Returns:
-            SiteIndex with complete site structure
+            Tuple of (files, folders, total size) added to target
         """
         logger.info(f"Indexing site: {site_name} ({site_id})")
 
         libraries = await self.get_document_libraries(site_id)
         if not libraries:
             logger.warning(f"No document libraries found for site {site_id}")
-            # Return empty site index
-            root_folder = FolderNode(
-                folder=FolderMetadata(id="root", name="root"),
-                path="",
-            )
-            return SiteIndex(
-                site_id=site_id,
-                site_name=site_name,
-                site_url=site_url,
-                root_folder=root_folder,
-                last_indexed=datetime.now(),
-            )
+            return 0, 0, 0
 
         # For now, index the first library (can be extended to handle multiple)
         # In a full implementation, you might want to merge multiple libraries
@@ -644,55 +775,56 @@ class SharePointService:
         # Use simplified flat file collection (faster and simpler)
         logger.info(f"Starting flat file collection for site {site_name}, drive {drive_id}")
         
-        # Build existing files map for incremental updates
-        existing_files_map = {}
-        if existing_index and existing_index.root_folder:
-            for file_meta in existing_index.root_folder.files:
-                existing_files_map[file_meta.id] = file_meta
-        
-        all_files = await self.get_all_files_flat(
-            drive_id, progress_callback, self, last_index_time, existing_files_map
-        )
-        logger.info(f"Completed file collection for site {site_name}: {len(all_files)} files")
-        
-        # Create a simple folder structure with all files in root (for compatibility)
-        # This is much simpler than building a full tree
-        root_folder = FolderNode(
-            folder=FolderMetadata(id="root", name="root", child_count=len(all_files)),
-            files=all_files,
-            subfolders={},
-            path="",
-        )
+        # All files go in the root folder (no tree is built); it counts as the one folder
+        files = target.root_folder.files
+        first_file = len(files)
+        delta_link = existing_index.delta_links.get(drive_id) if last_index_time and existing_index else None
+        next_delta_link = None
+
+        # Incremental runs only fetch what changed since the last run's delta link
+        if delta_link:
+            # Delta changes are applied to a copy of the previous run's folder paths
+            target.folder_paths.update(existing_index.folder_paths)
+            try:
+                next_delta_link = await self._collect_delta_files(
+                    drive_id, delta_link, target.folder_paths, files, progress_callback
+                )
+            except Exception as e:
+                logger.warning(f"Delta changes unavailable for site {site_name}: {e} - walking all folders")
+                delta_link = None
+
+        if not delta_link:
+            # Build existing files map for incremental updates
+            existing_files_map = {}
+            if existing_index and existing_index.root_folder:
+                for file_meta in existing_index.root_folder.files:
+                    existing_files_map[file_meta.id] = file_meta
+
+            # The delta link is taken before the walk, so changes made during it are picked up next time
+            target.folder_paths.clear()
+            try:
+                root = await self._make_request("GET", f"{self.graph_endpoint}/drives/{drive_id}/root", params={"$select": "id"})
+                _, next_delta_link = await self.get_delta_changes(drive_id, latest=True)
+            except Exception as e:
+                logger.warning(f"Could not start delta tracking for site {site_name}: {e} - next run walks all folders")
+            else:
+                target.folder_paths[root.get("id")] = ""
+            await self.get_all_files_flat(
+                drive_id, progress_callback, cancel_event, last_index_time, existing_files_map, files,
+                target.folder_paths if next_delta_link else None,
+            )
 
-        # Calculate statistics
-        def count_files_and_folders(node: FolderNode) -> tuple[int, int, int]:
-            """Recursively count files, folders, and total size."""
-            files_count = len(node.files)
-            folders_count = 1  # Count this folder
-            total_size = sum(f.size or 0 for f in node.files)
-
-            for subfolder in node.subfolders.values():
-                sub_files, sub_folders, sub_size = count_files_and_folders(subfolder)
-                files_count += sub_files
-                folders_count += sub_folders
-                total_size += sub_size
-
-            return files_count, folders_count, total_size
-
-        total_files, total_folders, total_size = count_files_and_folders(root_folder)
-
-        return SiteIndex(
-            site_id=site_id,
-            site_name=site_name,
-            site_url=site_url,
-            root_folder=root_folder,
-            total_files=total_files,
-            total_folders=total_folders,
-            total_size=total_size,
-            last_indexed=datetime.now(),
-        )
+        # Only a complete listing can be carried forward with delta changes
+        if next_delta_link and target.folder_paths:
+            target.delta_links[drive_id] = next_delta_link
+        total_files = len(files) - first_file
+        total_size = sum(f.size or 0 for f in islice(files, first_file, None))
+        logger.info(f"Completed file collection for site {site_name}: {total_files} files")
+
+        return total_files, 1, total_size
 
     @staticmethod
+    @lru_cache(maxsize=65536)  # Files in a drive often share timestamps; datetimes are immutable
     def _parse_datetime(dt_str: Optional[str]) -> Optional[datetime]:
         """Parse ISO datetime string.
 
@@ -705,7 +837,8 @@ class SharePointService:
         if not dt_str:
             return None
         try:
-            return datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
-        except Exception:
+            # Python 3.11+ parses the trailing "Z" Graph uses natively
+            return datetime.fromisoformat(dt_str)
+        except (TypeError, ValueError):
             return None
 
@@ -0,0 +1,124 @@
+"""Shared HTTP client settings."""
+
+import asyncio
+import math
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from importlib.util import find_spec
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# HTTP/2 needs the optional h2 package (httpx[http2])
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+# 429s are retried on their own budget, separate from the attempts allowed for errors
+MAX_THROTTLE_RETRIES = 10
+
+# Graph accepts at most 20 requests per JSON batch
+GRAPH_BATCH_SIZE = 20
+
+
+def parse_retry_after(value: Optional[str], default: float = 5.0) -> float:
+    """Parse a Retry-After header into seconds to wait.
+
+    Args:
+        value: Header value, either delay seconds or an HTTP-date (RFC 9110)
+        default: Seconds to use when the header is missing or malformed
+
+    Returns:
+        Non-negative number of seconds
+    """
+    if value is None:
+        return default
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        pass
+    else:
+        return max(0.0, seconds) if math.isfinite(seconds) else default
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Retry delay with full jitter: uniform in [0, min(cap, base * 2**attempt)).
+
+    Randomizing the whole delay keeps concurrent retries from waking together.
+    """
+    return random.random() * min(cap, base * (2 ** attempt))
+
+
+async def graph_batch(
+    requests: List[Dict[str, Any]],
+    send: Callable[[List[Dict[str, Any]]], Awaitable[Dict[str, Any]]],
+    on_throttle: Callable[[], None],
+    concurrency: int,
+    retries: int = 3,
+) -> Dict[str, Dict[str, Any]]:
+    """Send requests through Graph JSON batching, 20 per call.
+
+    Throttled subrequests (429) are sent again in a later batch after their
+    Retry-After delay.
+
+    Args:
+        requests: Batch subrequests ({"id", "method", "url", ...}), ids unique
+        send: Coroutine function that POSTs one batch ({"requests": chunk}) and
+            returns the response JSON
+        on_throttle: Called once for each round that had throttled subrequests
+        concurrency: Maximum batch calls in flight at once
+        retries: Number of times a throttled subrequest is attempted
+
+    Returns:
+        Dict of request id -> subresponse ({"id", "status", "headers", "body"}).
+        Requests in a batch call that failed as a whole are left out.
+    """
+    batch_slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def send_chunk(chunk: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Send one batch call (None if it failed as a whole)."""
+        async with batch_slots:
+            try:
+                return await send(chunk)
+            except Exception as e:
+                logger.warning(f"Batch request of {len(chunk)} subrequests failed: {e}")
+                return None
+
+    responses: Dict[str, Dict[str, Any]] = {}
+    pending = list(requests)
+    for attempt in range(retries):
+        throttled: List[Dict[str, Any]] = []
+        retry_after = 0.0
+        chunks = [pending[start:start + GRAPH_BATCH_SIZE] for start in range(0, len(pending), GRAPH_BATCH_SIZE)]
+        results = await asyncio.gather(*(send_chunk(chunk) for chunk in chunks))
+        for chunk, result in zip(chunks, results):
+            if result is None:
+                continue
+            # Responses may come back in any order
+            by_id = {r.get("id"): r for r in result.get("responses", [])}
+            for request in chunk:
+                response = by_id.get(request["id"])
+                if response is None:
+                    continue
+                if response.get("status") == 429 and attempt < retries - 1:
+                    throttled.append(request)
+                    headers = response.get("headers") or {}
+                    retry_after = max(retry_after, parse_retry_after(headers.get("Retry-After"), default=1.0))
+                    continue
+                responses[request["id"]] = response
+        if not throttled:
+            break
+        on_throttle()
+        # Retry-After is the minimum wait; jitter spreads out the retries
+        retry_after = max(retry_after, backoff_delay(attempt))
+        logger.warning(f"{len(throttled)} batched requests rate limited. Waiting {retry_after:.1f} seconds...")
+        await asyncio.sleep(retry_after)
+        pending = throttled
+    return responses
@@ -1,14 +1,81 @@
 """Structured logging configuration."""
 
+import atexit
 import logging
+import os
+import queue
 import sys
+import threading
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 from app.config import settings
 
 # Configure logging format
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+LOG_LEVEL = getattr(logging, settings.log_level.upper(), logging.INFO)
 
+# Log calls only enqueue records; one background thread formats and writes them
+# to stdout, so request and indexing code never blocks on console I/O
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+_stdout_handler = logging.StreamHandler(sys.stdout)
+_stdout_handler.setLevel(LOG_LEVEL)
+_stdout_handler.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
 
+# The listener thread is started on first use in each process, so importing
+# this module starts nothing and a forked worker gets a thread of its own
+_listener: Optional[QueueListener] = None
+_listener_pid: Optional[int] = None
+_listener_lock = threading.Lock()
+
+
+def start_logging() -> None:
+    """Start writing queued records to stdout in this process (idempotent)."""
+    global _listener, _listener_pid
+    with _listener_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            return
+        _listener = QueueListener(_log_queue, _stdout_handler, respect_handler_level=True)
+        _listener.start()
+        if _listener_pid is None:
+            # Flush queued records on interpreter exit
+            atexit.register(stop_logging)
+        _listener_pid = os.getpid()
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+        _listener = None
+
+
+def configure_app_logging() -> None:
+    """Apply process-wide logging settings for the app and start the listener.
+
+    Called from the application lifespan rather than at import, so importing
+    the app's modules doesn't change logging for the rest of the process.
+    """
+    # The format doesn't show thread or process details, so records skip looking them up
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    start_logging()
+
+
+class _LazyQueueHandler(QueueHandler):
+    """QueueHandler that makes sure this process has a listener running."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if _listener is None or _listener_pid != os.getpid():
+            start_logging()
+        super().enqueue(record)
+
+
+@lru_cache(maxsize=None)  # Repeat calls for a name return the already configured logger
 def setup_logger(name: str = __name__) -> logging.Logger:
     """Set up and return a logger instance.
 
@@ -19,15 +86,12 @@ def setup_logger(name: str = __name__) -> logging.Logger:
         Configured logger instance
     """
     logger = logging.getLogger(name)
-    logger.setLevel(getattr(logging, settings.log_level.upper(), logging.INFO))
+    logger.setLevel(LOG_LEVEL)
 
     # Avoid adding handlers multiple times
     if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(getattr(logging, settings.log_level.upper(), logging.INFO))
-        formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.addHandler(_LazyQueueHandler(_log_queue))
+        # Records are written here; passing them up to the root logger would only repeat the work
+        logger.propagate = False
 
     return logger
-
@@ -1,12 +1,31 @@
 """Pagination utilities for API responses."""
 
-from typing import Generic, TypeVar, List, Optional
+import base64
+from itertools import islice
+from typing import Any, Callable, Collection, Generic, Iterable, Sequence, TypeVar, List, Optional
+import orjson
 from pydantic import BaseModel
 
 T = TypeVar("T")
 
 
-class PaginatedResponse(BaseModel, Generic[T]):
+class _Page(BaseModel):
+    """Base for page models, whose items are plain row dicts."""
+
+    def to_json(self) -> bytes:
+        """Serialize the page with orjson.
+
+        Pages hold plain row dicts built by the route, so they are encoded
+        directly instead of going through pydantic's serializer. UTC times
+        keep pydantic's trailing "Z".
+
+        Returns:
+            Encoded JSON body
+        """
+        return orjson.dumps(self.__dict__, option=orjson.OPT_UTC_Z)
+
+
+class PaginatedResponse(_Page, Generic[T]):
     """Generic paginated response model."""
 
     items: List[T]
@@ -18,19 +37,87 @@ class PaginatedResponse(BaseModel, Generic[T]):
     has_previous: bool
 
 
+class CursorPaginatedResponse(_Page, Generic[T]):
+    """Generic cursor-paginated response model.
+
+    next_token resumes right after the last item of the page, so deep pages
+    cost the same as the first one and don't shift when items are added.
+    """
+
+    items: List[T]
+    page_size: int
+    next_token: Optional[str] = None
+    has_next: bool = False
+
+
+def encode_page_token(key: Sequence[Any]) -> str:
+    """Encode the sort key of a page's last item as an opaque page token.
+
+    Args:
+        key: JSON-serializable sort key
+
+    Returns:
+        URL-safe token
+    """
+    return base64.urlsafe_b64encode(orjson.dumps(key)).decode("ascii").rstrip("=")
+
+
+def decode_page_token(token: str) -> Optional[List[Any]]:
+    """Decode a page token made by encode_page_token.
+
+    Args:
+        token: Token from a previous page
+
+    Returns:
+        Sort key of the item to resume after, or None if the token is malformed
+    """
+    try:
+        key = orjson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        return None
+    return key if isinstance(key, list) else None
+
+
 def paginate(
-    items: List[T],
+    items: Collection[T],
+    page: int = 1,
+    page_size: int = 50,
+    max_page_size: int = 500,
+) -> PaginatedResponse[T]:
+    """Paginate a sized collection of items (a list, dict view, ...).
+
+    Args:
+        items: Items to paginate, in display order
+        page: Page number (1-indexed)
+        page_size: Number of items per page
+        max_page_size: Maximum allowed page size
+
+    Returns:
+        PaginatedResponse with paginated items and metadata
+    """
+    return paginate_iterable(items, len(items), page, page_size, max_page_size)
+
+
+def paginate_iterable(
+    items: Iterable[Any],
+    total: int,
     page: int = 1,
     page_size: int = 50,
     max_page_size: int = 500,
+    transform: Optional[Callable[[Any], T]] = None,
 ) -> PaginatedResponse[T]:
-    """Paginate a list of items.
+    """Paginate a lazily-produced sequence of known length.
+
+    Only the items on the requested page are pulled from the iterable and
+    passed through transform, so callers can skip building every row.
 
     Args:
-        items: List of items to paginate
+        items: Iterable of items in display order
+        total: Total number of items the iterable would produce
         page: Page number (1-indexed)
         page_size: Number of items per page
         max_page_size: Maximum allowed page size
+        transform: Optional function applied to each item on the page
 
     Returns:
         PaginatedResponse with paginated items and metadata
@@ -39,15 +126,16 @@ def paginate(
     page_size = min(max(1, page_size), max_page_size)
     page = max(1, page)
 
-    total = len(items)
     total_pages = (total + page_size - 1) // page_size if total > 0 else 1
     page = min(page, total_pages)
 
-    # Calculate slice indices
     start = (page - 1) * page_size
-    end = start + page_size
-
-    paginated_items = items[start:end]
+    # Sequences are sliced directly rather than stepped through up to the page
+    if isinstance(items, Sequence):
+        window = items[start:start + page_size]
+    else:
+        window = islice(items, start, start + page_size)
+    paginated_items = [transform(item) for item in window] if transform else list(window)
 
     return PaginatedResponse(
         items=paginated_items,
@@ -58,4 +146,3 @@ def paginate(
         has_next=page < total_pages,
         has_previous=page > 1,
     )
-
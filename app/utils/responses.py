@@ -0,0 +1,24 @@
+"""Response classes."""
+
+from typing import Any
+import orjson
+from starlette.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson.
+
+    Defined here rather than imported from FastAPI, whose ORJSONResponse is
+    deprecated in newer releases.
+    """
+
+    def render(self, content: Any) -> bytes:
+        """Serialize content to JSON bytes.
+
+        Args:
+            content: Response content
+
+        Returns:
+            Encoded JSON body
+        """
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,36 @@
+"""Test configuration: settings the app needs before it can be imported, and shared fixtures."""
+
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+os.environ.setdefault("AZURE_TENANT_ID", "test-tenant")
+os.environ.setdefault("AZURE_CLIENT_ID", "test-client")
+os.environ.setdefault("AZURE_CLIENT_SECRET", "test-secret")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from app.models.index_models import FileMetadata, FolderMetadata, FolderNode, SiteIndex  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def make_site_index():
+    """Factory for a SiteIndex whose root folder holds one file per name.
+
+    Files get ids "<site_id>-<n>" and paths "<site_id>/<n>"; the site name is
+    the upper-cased site ID.
+    """
+    def make(site_id, names):
+        files = [FileMetadata(id=f"{site_id}-{i}", name=name, path=f"{site_id}/{i}") for i, name in enumerate(names)]
+        return SiteIndex(
+            site_id=site_id,
+            site_name=site_id.upper(),
+            site_url="",
+            root_folder=FolderNode(folder=FolderMetadata(id="root", name="Root", child_count=0), files=files, path=""),
+            total_files=len(files),
+            total_folders=1,
+            total_size=0,
+            last_indexed=datetime.now(timezone.utc),
+        )
+
+    return make
@@ -0,0 +1,91 @@
+"""Tests for the OAuth state check in the login flow."""
+
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.middleware.sessions import SessionMiddleware
+
+from app.routes import auth
+from app.utils.signing import make_token, verify_token
+
+
+class _FakeAuthService:
+    """Stands in for AuthService so the callback never calls Microsoft."""
+
+    def get_login_url(self, state):
+        return f"https://login.example.com/authorize?state={state}"
+
+    async def acquire_token_by_code(self, code):
+        return {"access_token": "token"}
+
+    async def get_user_info(self, access_token):
+        return {"mail": "user@example.com", "displayName": "User", "id": "1"}
+
+    def validate_user_domain(self, email):
+        return True
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(auth, "_auth_service", _FakeAuthService())
+    app = FastAPI()
+    app.add_middleware(SessionMiddleware, secret_key="test")
+    app.include_router(auth.router)
+    return TestClient(app, follow_redirects=False)
+
+
+def _start(client):
+    response = client.get("/auth/start")
+    return parse_qs(urlparse(response.headers["location"]).query)["state"][0]
+
+
+def test_token_purposes_are_separate():
+    assert verify_token(make_token("nonce", "auth"), "state", 60) is None
+    assert verify_token(make_token("nonce", "state"), "auth", 60) is None
+
+
+def test_start_sets_http_only_nonce_cookie(client):
+    response = client.get("/auth/start")
+    cookie = response.headers["set-cookie"]
+    assert cookie.startswith(f"{auth.OAUTH_STATE_COOKIE}=")
+    assert "HttpOnly" in cookie
+    assert "samesite=lax" in cookie.lower()
+
+
+def test_callback_accepts_state_from_same_browser(client):
+    state = _start(client)
+    response = client.get("/auth/callback", params={"code": "code", "state": state})
+    assert response.headers["location"] == "/"
+    assert auth.OAUTH_STATE_COOKIE not in client.cookies
+
+
+def test_state_cannot_be_reused(client):
+    state = _start(client)
+    client.get("/auth/callback", params={"code": "code", "state": state})
+    response = client.get("/auth/callback", params={"code": "code", "state": state})
+    assert response.headers["location"] == "/auth/login?error=invalid_state"
+
+
+def test_state_from_another_browser_is_rejected(client):
+    state = _start(client)
+    client.cookies.clear()
+    _start(client)
+    response = client.get("/auth/callback", params={"code": "code", "state": state})
+    assert response.headers["location"] == "/auth/login?error=invalid_state"
+
+
+@pytest.mark.parametrize("purpose", ["auth", "state"])
+def test_state_must_match_cookie_and_purpose(client, purpose):
+    client.cookies.set(auth.OAUTH_STATE_COOKIE, "nonce", path=auth.OAUTH_STATE_COOKIE_PATH)
+    response = client.get("/auth/callback", params={"code": "code", "state": make_token("nonce", purpose)})
+    expected = "/" if purpose == "state" else "/auth/login?error=invalid_state"
+    assert response.headers["location"] == expected
+
+
+def test_non_ascii_state_is_rejected(client):
+    _start(client)
+    response = client.get("/auth/callback", params={"code": "code", "state": "1.a.\xe9"})
+    assert response.status_code == 302
+    assert response.headers["location"] == "/auth/login?error=invalid_state"
@@ -0,0 +1,66 @@
+"""Tests for the cursor-paginated file listing."""
+
+import pytest
+
+from app.routes.sharepoint import _build_files_cursor_page
+from app.services.index_service import IndexService
+from app.utils.pagination import decode_page_token
+
+# Names tie within and across sites, including ties that only differ in case
+_NAMES = ["report.pdf", "Report.pdf", "a.txt", "b.txt", "REPORT.PDF", "z.doc", "a.txt"]
+
+
+@pytest.fixture
+def index_service(make_site_index):
+    service = IndexService()
+    # Sites are added out of order; the walk must not depend on insertion order
+    service.update_index([
+        make_site_index("s2", _NAMES), make_site_index("s1", _NAMES[::-1]), make_site_index("s3", ["report.pdf"] * 3)
+    ])
+    return service
+
+
+def _walk(index_service, site_id, limit):
+    rows, after, pages = [], None, 0
+    while True:
+        page = _build_files_cursor_page(index_service, site_id, after, limit)
+        rows.extend(page.items)
+        pages += 1
+        if not page.has_next:
+            assert page.next_token is None
+            return rows, pages
+        after = decode_page_token(page.next_token)
+        assert after is not None
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 17, 100])
+def test_walk_returns_every_file_once_in_name_order(index_service, limit):
+    rows, pages = _walk(index_service, None, limit)
+    paths = [row["path"] for row in rows]
+    expected = sorted(f.path for site in index_service.get_all_sites() for f in site.root_folder.files)
+    assert sorted(paths) == expected
+    assert len(set(paths)) == len(paths)
+    keys = [(row["name"].lower(), row["site_name"]) for row in rows]
+    assert keys == sorted(keys)
+    # The last page is known to be last without fetching an empty one
+    assert pages == -(-len(expected) // limit)
+
+
+def test_walk_is_the_same_for_every_page_size(index_service):
+    full, _ = _walk(index_service, None, 100)
+    for limit in (1, 2, 4, 7):
+        assert _walk(index_service, None, limit)[0] == full
+
+
+def test_walk_of_one_site(index_service):
+    rows, _ = _walk(index_service, "s1", 2)
+    assert sorted(row["path"] for row in rows) == sorted(f"s1/{i}" for i in range(len(_NAMES)))
+    assert {row["site_name"] for row in rows} == {"S1"}
+
+
+def test_cursor_for_a_removed_site_resumes_in_order(index_service):
+    # A token can name a site that is no longer indexed; rows tied on name
+    # sort around it by site ID
+    page = _build_files_cursor_page(index_service, None, ["report.pdf", "s1x", 0], 100)
+    first = page.items[0]
+    assert (first["name"].lower(), first["site_name"]) == ("report.pdf", "S2")
@@ -0,0 +1,68 @@
+"""Tests for the Retry-After, backoff and Graph batch helpers."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from app.utils import http
+from app.utils.http import backoff_delay, graph_batch, parse_retry_after
+
+
+@pytest.mark.parametrize("value, expected", [("0", 0.0), ("7", 7.0), ("1.5", 1.5), (" 3 ", 3.0), ("-4", 0.0)])
+def test_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, "", "soon", "nan", "inf", "Mon, 99 Foo 2024"])
+def test_retry_after_falls_back_to_default(value):
+    assert parse_retry_after(value, default=2.5) == 2.5
+
+
+def test_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 30
+
+
+def test_retry_after_http_date_in_the_past():
+    retry_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert parse_retry_after(format_datetime(retry_at, usegmt=True)) == 0.0
+
+
+@pytest.mark.parametrize("attempt", range(8))
+def test_backoff_delay_stays_within_the_capped_window(attempt):
+    window = min(30.0, 2 ** attempt)
+    delays = [backoff_delay(attempt) for _ in range(200)]
+    assert all(0 <= delay < window for delay in delays)
+
+
+def test_backoff_delay_uses_the_full_window(monkeypatch):
+    monkeypatch.setattr(http.random, "random", lambda: 0.999)
+    assert backoff_delay(2, base=0.5) == pytest.approx(0.999 * 2.0)
+    assert backoff_delay(20, cap=10.0) == pytest.approx(0.999 * 10.0)
+    monkeypatch.setattr(http.random, "random", lambda: 0.0)
+    assert backoff_delay(5) == 0.0
+
+
+def test_graph_batch_retries_throttled_subrequests(monkeypatch):
+    monkeypatch.setattr(http, "backoff_delay", lambda attempt: 0.0)
+    sent = []
+    throttles = []
+
+    async def send(chunk):
+        sent.append([request["id"] for request in chunk])
+        first_round = len(sent) <= 2
+        return {"responses": [
+            {"id": request["id"], "status": 429 if first_round and request["id"] == "3" else 200,
+             "headers": {"Retry-After": "0"}}
+            for request in reversed(chunk)
+        ]}
+
+    requests = [{"id": str(i), "method": "GET", "url": f"/items/{i}"} for i in range(25)]
+    responses = asyncio.run(graph_batch(requests, send, lambda: throttles.append(1), concurrency=2))
+    assert sorted(map(len, sent[:2])) == [5, 20]
+    assert sent[2:] == [["3"]]
+    assert throttles == [1]
+    assert set(responses) == {str(i) for i in range(25)}
+    assert all(response["status"] == 200 for response in responses.values())
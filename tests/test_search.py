@@ -0,0 +1,65 @@
+"""Tests for trigram file search against a plain substring scan."""
+
+import random
+import unicodedata
+
+import pytest
+
+from app.services.index_service import IndexService
+
+_FIXED_NAMES = [
+    "Quarterly Report.pdf", "report-final.docx", "REPORT.PDF", "Straße.txt", "STRASSE.txt",
+    "ﬁle.txt", "file.txt", "تقرير الميزانية.pdf", "التقرير.docx", "Café menu.pdf", "Café notes.pdf",
+    "aaaa.txt", "aaa", "aa", "",
+]
+
+
+def _fold(text):
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def _naive_search(index_service, query):
+    """Scan every name, ordered like search_files."""
+    query_folded = _fold(query)
+    matches = [
+        (file_meta.id, _fold(file_meta.name))
+        for site_index in index_service.get_all_sites()
+        for file_meta in site_index.root_folder.files
+        if query_folded in _fold(file_meta.name)
+    ]
+    matches.sort(key=lambda match: (0 if match[1].startswith(query_folded) else 1, match[1]))
+    return [file_id for file_id, _ in matches]
+
+
+@pytest.fixture(scope="module")
+def index_service(make_site_index):
+    rng = random.Random(0)
+    # A small alphabet makes trigrams repeat, so postings lists overlap heavily
+    random_names = ["".join(rng.choice("abAB .-") for _ in range(rng.randint(0, 12))) for _ in range(500)]
+    service = IndexService()
+    service.update_index([make_site_index("fixed", _FIXED_NAMES), make_site_index("random", random_names)])
+    return service
+
+
+@pytest.mark.parametrize("query", [
+    "", "a", "ab", "aba", "abab", "aaaa", "a b", "B.A", " .", "report", "REPORT", "rep", "port.p",
+    "strasse", "ß", "file", "ﬁle", "تقرير", "قر", "café", "cafe", "zzz", "quarterly report.pdf",
+])
+def test_search_matches_naive_scan(index_service, query):
+    results = index_service.search_files(query)
+    assert [file_meta.id for _, file_meta, _ in results] == _naive_search(index_service, query)
+
+
+def test_random_queries_match_naive_scan(index_service):
+    rng = random.Random(1)
+    for _ in range(300):
+        query = "".join(rng.choice("abAB .-") for _ in range(rng.randint(1, 6)))
+        results = index_service.search_files(query)
+        assert [file_meta.id for _, file_meta, _ in results] == _naive_search(index_service, query), query
+
+
+def test_limit_keeps_the_first_matches_in_index_order(index_service):
+    full = [file_meta.id for _, file_meta, _ in index_service.search_files("ab")]
+    limited = [file_meta.id for _, file_meta, _ in index_service.search_files("ab", limit=5)]
+    assert len(limited) == 5
+    assert set(limited) <= set(full)
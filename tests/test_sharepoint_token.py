@@ -0,0 +1,44 @@
+"""Tests for the Graph token shared by SharePointService instances."""
+
+import asyncio
+
+import pytest
+
+from app.services import sharepoint_service
+from app.services.sharepoint_service import SharePointService
+
+
+class _FakeMsalApp:
+    """Stands in for ConfidentialClientApplication, counting token requests."""
+
+    issued = 0
+
+    def acquire_token_for_client(self, scopes):
+        _FakeMsalApp.issued += 1
+        return {"access_token": f"token-{_FakeMsalApp.issued}", "expires_in": 3600}
+
+
+@pytest.fixture(autouse=True)
+def fake_msal(monkeypatch):
+    _FakeMsalApp.issued = 0
+    monkeypatch.setattr(sharepoint_service, "ConfidentialClientApplication", lambda **kwargs: _FakeMsalApp())
+    SharePointService.reset_token_cache()
+    yield
+    SharePointService.reset_token_cache()
+
+
+async def _get_tokens(count):
+    service = SharePointService()
+    return await asyncio.gather(*(service._get_access_token() for _ in range(count)))
+
+
+def test_concurrent_callers_share_one_token():
+    assert asyncio.run(_get_tokens(5)) == ["token-1"] * 5
+    assert _FakeMsalApp.issued == 1
+
+
+def test_reset_allows_use_from_a_new_event_loop():
+    asyncio.run(_get_tokens(2))
+    SharePointService.reset_token_cache()
+    # A new loop gets a new lock and token instead of "bound to a different event loop"
+    assert asyncio.run(_get_tokens(2)) == ["token-2"] * 2
@@ -0,0 +1,77 @@
+"""Tests for the signed token helpers and the auth cookie built on them."""
+
+import base64
+import time
+
+import orjson
+import pytest
+
+from app.routes.auth import AUTH_COOKIE_MAX_AGE, read_auth_cookie
+from app.utils.signing import make_token, verify_token
+
+
+def test_round_trip():
+    token = make_token("payload", "auth")
+    assert verify_token(token, "auth", 60) == "payload"
+
+
+def test_forged_signature_is_rejected():
+    token = make_token("payload", "auth")
+    body, _, signature = token.rpartition(".")
+    forged = body + "." + ("0" if signature[0] != "0" else "1") + signature[1:]
+    assert verify_token(forged, "auth", 60) is None
+
+
+def test_tampered_payload_is_rejected():
+    issued, payload, signature = make_token("payload", "auth").split(".")
+    assert verify_token(f"{issued}.other.{signature}", "auth", 60) is None
+    assert verify_token(f"{int(issued) + 1}.{payload}.{signature}", "auth", 60) is None
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    token = make_token("payload", "auth")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert verify_token(token, "auth", 60) is None
+
+
+def test_token_from_the_future_is_rejected(monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 3600)
+    token = make_token("payload", "auth")
+    monkeypatch.setattr(time, "time", lambda: now)
+    assert verify_token(token, "auth", 7200) is None
+
+
+@pytest.mark.parametrize("token", ["", "payload", "1.payload", "x.payload.sig", "..", "1..sig"])
+def test_malformed_token_is_rejected(token):
+    assert verify_token(token, "auth", 60) is None
+
+
+@pytest.mark.parametrize("token", ["1.a.\xe9", "1.\xe9.abc", "١.a.b", "1.a." + "\xe9" * 64])
+def test_non_ascii_token_is_rejected(token):
+    assert verify_token(token, "auth", 60) is None
+
+
+def test_auth_cookie_round_trip():
+    user = {"email": "user@example.com", "name": "User", "id": "1"}
+    payload = base64.urlsafe_b64encode(orjson.dumps(user)).decode("ascii").rstrip("=")
+    assert read_auth_cookie(make_token(payload, "auth")) == user
+
+
+@pytest.mark.parametrize("value", ["1.a.\xe9", "garbage", make_token("!!!", "auth")])
+def test_invalid_auth_cookie_reads_as_none(value):
+    assert read_auth_cookie(value) is None
+
+
+def test_auth_cookie_must_hold_an_object():
+    payload = base64.urlsafe_b64encode(orjson.dumps([1, 2])).decode("ascii").rstrip("=")
+    assert read_auth_cookie(make_token(payload, "auth")) is None
+
+
+def test_expired_auth_cookie_reads_as_none(monkeypatch):
+    payload = base64.urlsafe_b64encode(orjson.dumps({"email": "a"})).decode("ascii").rstrip("=")
+    token = make_token(payload, "auth")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + AUTH_COOKIE_MAX_AGE)
+    assert read_auth_cookie(token) is None